@@ -7,8 +7,12 @@ from datetime import datetime, timedelta, timezone
 import os
 from dotenv import load_dotenv
 
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+import metrics
+from cache import TTLCache
+from workers import BoundedExecutor, ExecutorSaturated
 from database import get_db
 from schemas import TokenData
 from models import User
@@ -21,33 +25,100 @@ SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Resolved users for get_current_user, keyed by username. Entries are dropped
+# whenever the user row is updated or deleted through the ORM.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+)
+metrics.register("user_cache", user_cache.stats)
+
+# Login identifiers that matched no user, so repeated attempts against
+# unknown accounts (credential stuffing) skip the users table for a while.
+# Entries are dropped when a matching user registers.
+unknown_identifier_cache = TTLCache(
+    maxsize=int(os.getenv("LOGIN_NEGATIVE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("LOGIN_NEGATIVE_CACHE_TTL_SECONDS", "30")),
+)
+metrics.register("login_negative_cache", unknown_identifier_cache.stats)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt is deliberately slow CPU work; run it on a dedicated pool so a burst
+# of logins cannot stall the event loop, and shed load once the queue is full
+password_executor = BoundedExecutor(
+    "password_hashing",
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64")),
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+# For endpoints that also accept the token elsewhere, e.g. a query parameter
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
 
 router = APIRouter()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def _run_password_task(fn, *args):
+    try:
+        return await password_executor.run(fn, *args)
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def verify_password(plain_password, hashed_password):
+    return await _run_password_task(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password):
+    return await _run_password_task(pwd_context.hash, password)
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_user(db: AsyncSession, identifier: str):
+    result = await db.execute(select(User).where((User.username == identifier) | (User.email == identifier)))
+    return result.scalars().first()
 
 
-def get_user(db: Session, identifier: str):
-    db_user = db.query(User).filter((User.username == identifier) | (User.email == identifier)).first()
-    return db_user
+async def get_user_for_login(db: AsyncSession, identifier: str):
+    # One equality lookup on a single indexed column; an OR across username
+    # and email can stop some backends from using either index
+    if "@" in identifier:
+        result = await db.execute(select(User).where(User.email == identifier))
+        user = result.scalars().first()
+        if user:
+            return user
+        # Usernames may contain "@" too
+    result = await db.execute(select(User).where(User.username == identifier))
+    return result.scalars().first()
 
 
-def authenticate_user(db: Session, identifier: str, password: str):
-    user = get_user(db, identifier)
+async def authenticate_user(db: AsyncSession, identifier: str, password: str):
+    if unknown_identifier_cache.get(identifier, None):
+        return False
+    user = await get_user_for_login(db, identifier)
     if not user:
-        user = db.query(User).filter(User.email == identifier).first()
-    if not user or not verify_password(password, user.hashed_password):
+        unknown_identifier_cache.set(identifier, True)
+        return False
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
 
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate(target.username)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+def _invalidate_unknown_identifier(mapper, connection, target):
+    unknown_identifier_cache.invalidate(target.username)
+    unknown_identifier_cache.invalidate(target.email)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -59,7 +130,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -74,9 +145,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except InvalidTokenError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = user_cache.get(token_data.username, None)
+    if user is not None:
+        return user
+
+    result = await db.execute(select(User).where(User.username == token_data.username))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    user_cache.set(token_data.username, user)
     return user
 
 
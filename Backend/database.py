@@ -1,25 +1,154 @@
 # database.py
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, MetaData
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from models import Base
+from migrations import run_migrations
+import logging
 import os
 from dotenv import load_dotenv
 
+logger = logging.getLogger("uvicorn.error")
+
 # Load environment variables
 load_dotenv()
 
 # Get database URL from environment or use default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
-engine = create_engine(DATABASE_URL)
+# Async driver used for each backend when DATABASE_URL names a sync driver.
+# DATABASE_URL may name either flavour (e.g. sqlite:/// or sqlite+aiosqlite:///);
+# the missing one is derived so both engines always point at the same database.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+SYNC_DRIVERS = {
+    "sqlite": "sqlite",
+    "postgresql": "postgresql",
+    "mysql": "mysql+pymysql",
+}
+ASYNC_DRIVER_NAMES = {"aiosqlite", "asyncpg", "aiomysql", "asyncmy", "psycopg_async"}
+
+
+def _is_async_url(url) -> bool:
+    return url.get_driver_name() in ASYNC_DRIVER_NAMES
+
+
+def get_async_url(database_url: str):
+    """Return the async-driver form of ``database_url``."""
+    url = make_url(database_url)
+    if _is_async_url(url):
+        return url
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def get_sync_url(database_url: str):
+    """Return the sync-driver form of ``database_url``."""
+    url = make_url(database_url)
+    if not _is_async_url(url):
+        return url
+    return url.set(drivername=SYNC_DRIVERS.get(url.get_backend_name(), url.get_backend_name()))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Connection pool settings; size DB_POOL_SIZE + DB_MAX_OVERFLOW to the
+# number of requests a single worker should run against the database at once
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+}
+
+# Pragmas applied to every new SQLite connection. WAL lets readers run
+# alongside a writer and busy_timeout makes writers wait instead of failing
+# with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+}
+
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def get_engine_options(url, is_async: bool = False) -> dict:
+    """Build create_engine keyword arguments for ``url`` from the pool settings."""
+    if _is_sqlite_memory(url):
+        # In-memory databases live in a single connection; pooling does not apply
+        return {}
+    options = dict(POOL_SETTINGS)
+    if is_async and url.get_backend_name() == "sqlite":
+        # aiosqlite defaults to NullPool, which reopens the file on every request
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+def apply_sqlite_pragmas(sync_engine):
+    """Register a connect hook that applies SQLITE_PRAGMAS to each new connection."""
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            if _is_sqlite_memory(sync_engine.url) and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+async def dispose_engines():
+    """Close pooled connections; pooled aiosqlite connections would otherwise keep the process alive."""
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def log_engine_settings():
+    """Log the effective database configuration at startup."""
+    logger.info("Database: %s", async_engine.url.render_as_string(hide_password=True))
+    if get_engine_options(async_engine.url, is_async=True):
+        logger.info("Connection pool: %s %s", async_engine.pool.__class__.__name__, POOL_SETTINGS)
+    else:
+        logger.info("Connection pool: %s", async_engine.pool.__class__.__name__)
+    if async_engine.url.get_backend_name() == "sqlite":
+        logger.info("SQLite pragmas: %s", SQLITE_PRAGMAS)
+
+
+_sync_url = get_sync_url(DATABASE_URL)
+_async_url = get_async_url(DATABASE_URL)
+
+# Sync engine: schema creation and standalone scripts (seeding)
+engine = create_engine(_sync_url, **get_engine_options(_sync_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine: used by every request handler so queries never block the event loop
+async_engine = create_async_engine(_async_url, **get_engine_options(_async_url, is_async=True))
+
+if _async_url.get_backend_name() == "sqlite":
+    apply_sqlite_pragmas(engine)
+    apply_sqlite_pragmas(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
 metadata = MetaData()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+# Create missing tables, then bring existing ones forward (indexes, columns)
+Base.metadata.create_all(bind=engine)
+run_migrations(engine)
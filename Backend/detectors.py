@@ -0,0 +1,374 @@
+# detectors.py - Pluggable crop disease detection backends
+# DISEASE_DETECTOR selects how routers/crop_health.py identifies diseases:
+#   remote - the CROP_DISEASE_API_URL service (mock result when it is not configured)
+#   local  - an ONNX model run on CPU worker processes, falling back to the remote
+#            service when the model is not confident enough
+#   mock   - always the built-in mock result
+# The local backend needs the optional onnxruntime, numpy and Pillow packages.
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import metrics
+from disease_api import crop_disease_api_configured, crop_disease_api_identify, DiseaseAPIError, ServiceDegraded
+from disease_cache import identify_with_cache
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+DISEASE_DETECTOR = os.getenv("DISEASE_DETECTOR", "remote")
+DISEASE_DETECTOR_MIN_CONFIDENCE = float(os.getenv("DISEASE_DETECTOR_MIN_CONFIDENCE", "0.6"))
+ML_MODEL_PATH = os.getenv("ML_MODEL_PATH", "./models/crop_disease_detection.onnx")
+ML_LABELS_PATH = os.getenv("ML_LABELS_PATH", "./models/crop_disease_labels.json")
+ML_INPUT_SIZE = int(os.getenv("ML_INPUT_SIZE", "224"))
+ML_WORKERS = int(os.getenv("ML_WORKERS", "2"))
+ML_MAX_BATCH = int(os.getenv("ML_MAX_BATCH", "8"))
+ML_BATCH_WAIT_MS = float(os.getenv("ML_BATCH_WAIT_MS", "10"))
+
+# Structured mock response with realistic disease data, served when no backend is available
+MOCK_RESULT = {
+    "name": "Late Blight",
+    "scientific_name": "Phytophthora infestans",
+    "probability": 0.89,
+    "treatment": {
+        "prevention": [
+            "Plant resistant varieties when available",
+            "Ensure proper spacing between plants for good air circulation",
+            "Avoid overhead irrigation and water early in the day",
+            "Rotate crops (3-4 year rotation)",
+            "Remove and destroy all infected plant debris"
+        ],
+        "chemical": [
+            "Chlorothalonil-based fungicides (preventative)",
+            "Mancozeb-based products (preventative)",
+            "Metalaxyl or mefenoxam combined with a protectant fungicide",
+            "Copper-based fungicides for organic production"
+        ],
+        "biological": [
+            "Bacillus subtilis-based products",
+            "Trichoderma harzianum-based products",
+            "Compost tea applications to boost plant immunity"
+        ]
+    }
+}
+
+
+class DiseaseDetector(ABC):
+    """
+    Interface for disease identification backends.
+
+    identify() returns a dict with name, scientific_name, probability and
+    treatment lists, and raises DiseaseAPIError when the image cannot be
+    identified. start() and stop() are called from the application lifecycle.
+    """
+
+    name = "base"
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def identify(self, db: AsyncSession, filename: str, content: bytes, content_type: str) -> dict:
+        ...
+
+
+class MockDetector(DiseaseDetector):
+    """Graceful degradation when no backend is configured; enables development without external dependencies."""
+
+    name = "mock"
+
+    async def identify(self, db: AsyncSession, filename: str, content: bytes, content_type: str) -> dict:
+        return MOCK_RESULT
+
+
+class RemoteDetector(DiseaseDetector):
+    """The CROP_DISEASE_API_URL service, behind the content-hash cache."""
+
+    name = "crop_disease_api"
+
+    async def identify(self, db: AsyncSession, filename: str, content: bytes, content_type: str) -> dict:
+        return await identify_with_cache(
+            db, "crop_disease_api", content,
+            lambda: crop_disease_api_identify(filename, content, content_type)
+        )
+
+
+# Worker process state; set once per process by _init_worker
+_session = None
+_input_size = None
+
+
+def _init_worker(model_path: str, input_size: int):
+    """Load the model once when a worker process starts."""
+    global _session, _input_size
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    # Each worker process gets one core; parallelism comes from the pool
+    options.intra_op_num_threads = 1
+    _session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    _input_size = input_size
+
+
+def _warm_up() -> bool:
+    return _session is not None
+
+
+def _preprocess(content: bytes):
+    import io
+    import numpy as np
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(content)).convert("RGB").resize((_input_size, _input_size))
+    pixels = np.asarray(image, dtype=np.float32) / 255.0
+    pixels = (pixels - (0.485, 0.456, 0.406)) / (0.229, 0.224, 0.225)
+    return pixels.transpose(2, 0, 1).astype(np.float32)
+
+
+def _infer_batch(images: List[bytes]) -> list:
+    """
+    Classify a batch of encoded images in one model call.
+
+    Returns one (class_index, probability) tuple per image, or an error
+    string for images that could not be decoded.
+    """
+    import numpy as np
+
+    outcomes: list = [None] * len(images)
+    tensors, positions = [], []
+    for position, content in enumerate(images):
+        try:
+            tensors.append(_preprocess(content))
+            positions.append(position)
+        except Exception as e:
+            outcomes[position] = f"Could not decode image: {e}"
+
+    if tensors:
+        input_name = _session.get_inputs()[0].name
+        logits = _session.run(None, {input_name: np.stack(tensors)})[0]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+        for position, row in zip(positions, probabilities):
+            index = int(row.argmax())
+            outcomes[position] = (index, float(row[index]))
+    return outcomes
+
+
+class LocalDetector(DiseaseDetector):
+    """
+    ONNX image classifier run on a pool of CPU worker processes.
+
+    Each worker loads the model once at startup. Concurrent requests are
+    collected for up to ``batch_wait_ms`` (at most ``max_batch`` images) and
+    classified in a single model call. Results below ``min_confidence`` are
+    re-checked with ``fallback`` when one is configured. If a worker process
+    dies the pool is rebuilt and the lost batch is answered by ``fallback``
+    (or the remote/mock detector).
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_path: str,
+        labels_path: str,
+        fallback: Optional[DiseaseDetector] = None,
+        min_confidence: float = DISEASE_DETECTOR_MIN_CONFIDENCE,
+        workers: int = ML_WORKERS,
+        max_batch: int = ML_MAX_BATCH,
+        batch_wait_ms: float = ML_BATCH_WAIT_MS,
+        input_size: int = ML_INPUT_SIZE,
+    ):
+        self.model_path = model_path
+        self.labels_path = labels_path
+        self.fallback = fallback
+        self.min_confidence = min_confidence
+        self.workers = workers
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.input_size = input_size
+        self.labels: List[dict] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+        self.batches = 0
+        self.images = 0
+        self.fallbacks = 0
+        self.pool_restarts = 0
+
+    async def start(self):
+        for module in ("onnxruntime", "numpy", "PIL"):
+            if importlib.util.find_spec(module) is None:
+                raise RuntimeError(f"The local disease detector requires the {module} package")
+        with open(self.labels_path) as f:
+            self.labels = [
+                label if isinstance(label, dict) else {"name": label}
+                for label in json.load(f)
+            ]
+
+        self._executor = self._new_pool()
+        loop = asyncio.get_running_loop()
+        # Start every worker now so no request pays for loading the model
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)))
+
+        self._pending = asyncio.Queue()
+        self._batch_slots = asyncio.Semaphore(self.workers)
+        self._collector = asyncio.create_task(self._collect_batches())
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self.model_path, self.input_size)
+        )
+
+    async def stop(self):
+        if self._collector is not None:
+            self._collector.cancel()
+            await asyncio.gather(self._collector, return_exceptions=True)
+            self._collector = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._pending.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Only hand the pool as many batches as it has workers; the rest keep collecting
+            await self._batch_slots.acquire()
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list):
+        executor = self._executor
+        try:
+            outcomes = await asyncio.get_running_loop().run_in_executor(
+                executor, _infer_batch, [content for content, _ in batch]
+            )
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._executor is executor:
+                # A worker died; replace the pool so later batches run again
+                logger.error("Disease model worker pool broke, restarting it")
+                self.pool_restarts += 1
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_pool()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._batch_slots.release()
+
+        self.batches += 1
+        self.images += len(batch)
+        for (_, future), outcome in zip(batch, outcomes):
+            if not future.done():
+                future.set_result(outcome)
+
+    def _result(self, index: int, probability: float) -> dict:
+        label = self.labels[index] if index < len(self.labels) else {"name": f"class_{index}"}
+        treatment = label.get("treatment", {})
+        return {
+            "name": label["name"],
+            "scientific_name": label.get("scientific_name", "N/A"),
+            "probability": probability,
+            "treatment": {
+                "prevention": treatment.get("prevention", []),
+                "chemical": treatment.get("chemical", []),
+                "biological": treatment.get("biological", [])
+            }
+        }
+
+    async def identify(self, db: AsyncSession, filename: str, content: bytes, content_type: str) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.put_nowait((content, future))
+        try:
+            outcome = await future
+        except BrokenProcessPool:
+            # The batch was lost with its worker; answer it from the fallback instead
+            self.fallbacks += 1
+            backup = self.fallback or _default_detector()
+            return await backup.identify(db, filename, content, content_type)
+        if isinstance(outcome, str):
+            raise DiseaseAPIError(outcome, status_code=400)
+
+        result = self._result(*outcome)
+        if result["probability"] >= self.min_confidence or self.fallback is None:
+            return result
+        self.fallbacks += 1
+        try:
+            return await self.fallback.identify(db, filename, content, content_type)
+        except ServiceDegraded:
+            # A low-confidence local answer beats none while the remote service is down
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._pending.qsize() if self._pending is not None else 0,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+            "pool_restarts": self.pool_restarts,
+        }
+
+
+def _default_detector() -> DiseaseDetector:
+    return RemoteDetector() if crop_disease_api_configured() else MockDetector()
+
+
+def build_detector(kind: str = DISEASE_DETECTOR) -> DiseaseDetector:
+    """Create the detector selected by DISEASE_DETECTOR."""
+    if kind == "mock":
+        return MockDetector()
+    if kind == "local":
+        fallback = RemoteDetector() if crop_disease_api_configured() else None
+        return LocalDetector(ML_MODEL_PATH, ML_LABELS_PATH, fallback=fallback)
+    if kind != "remote":
+        logger.warning("Unknown DISEASE_DETECTOR %r, using the remote detector", kind)
+    return _default_detector()
+
+
+detector: DiseaseDetector = _default_detector()
+
+
+async def start_detector():
+    """Build and start the configured detector; falls back to the remote/mock detector if it cannot start."""
+    global detector
+    configured = build_detector()
+    try:
+        await configured.start()
+    except Exception:
+        logger.exception("Could not start the %s disease detector, using %s instead", configured.name, detector.name)
+        await configured.stop()
+        return
+    detector = configured
+    if isinstance(detector, LocalDetector):
+        metrics.register("local_disease_detector", detector.stats)
+    logger.info("Disease detector: %s", detector.name)
+
+
+async def stop_detector():
+    await detector.stop()
@@ -0,0 +1,133 @@
+# disease_api.py - Clients for the external crop disease identification services
+# KindWise (used by routers/farm.py) and the configurable CROP_DISEASE_API_URL
+# service (used by routers/crop_health.py). Both go through the shared pooled
+# client in http_client.py; base URLs can point at a local stand-in for testing.
+# An unreachable, failing or circuit-broken upstream raises ServiceDegraded.
+import os
+
+import httpx
+from dotenv import load_dotenv
+
+import http_client
+from resilience import CircuitOpenError
+
+load_dotenv()
+
+KINDWISE_API_KEY = os.getenv("KINDWISE_API_KEY", "")
+KINDWISE_API_URL = os.getenv("KINDWISE_API_URL", "https://crop.kindwise.com/api/v1").rstrip("/")
+CROP_DISEASE_API_KEY = os.getenv("CROP_DISEASE_API_KEY")
+CROP_DISEASE_API_URL = os.getenv("CROP_DISEASE_API_URL")
+
+
+class DiseaseAPIError(Exception):
+    """Raised when an identification service fails or returns an unusable response"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ServiceDegraded(DiseaseAPIError):
+    """Raised when the upstream is unavailable; callers should fall back or ask clients to retry later"""
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message, status_code=503)
+        self.retry_after = retry_after
+
+
+def _degraded(e: Exception, message: str) -> ServiceDegraded:
+    if isinstance(e, CircuitOpenError):
+        return ServiceDegraded(message, retry_after=max(1, int(e.retry_after)))
+    return ServiceDegraded(message)
+
+
+def crop_disease_api_configured() -> bool:
+    return bool(CROP_DISEASE_API_KEY and CROP_DISEASE_API_URL)
+
+
+async def kindwise_identify(filename: str, content: bytes, content_type: str) -> dict:
+    """
+    Identify a crop disease with KindWise and return the most likely result.
+
+    Returns:
+        Dict with name, scientific_name, probability and treatment lists
+    """
+    files = {
+        "images": (filename, content, content_type)
+    }
+    data = {
+        "latitude": "0.0",
+        "longitude": "0.0",
+        "similar_images": "true"
+    }
+    headers = {
+        "Api-Key": KINDWISE_API_KEY
+    }
+
+    try:
+        # Step 1: Identify Disease
+        post_response = await http_client.request(
+            "kindwise", "POST", f"{KINDWISE_API_URL}/identification",
+            headers=headers, data=data, files=files,
+            # Each accepted submission is a paid identification
+            idempotent=False
+        )
+        if http_client.is_upstream_failure(post_response):
+            raise ServiceDegraded("Disease identification service unavailable")
+        if post_response.status_code != 201:
+            raise DiseaseAPIError("Failed to identify disease")
+
+        access_token = post_response.json().get("access_token")
+        if not access_token:
+            raise DiseaseAPIError("No access token received")
+
+        # Step 2: Get Treatment Details
+        details_response = await http_client.request(
+            "kindwise", "GET", f"{KINDWISE_API_URL}/identification/{access_token}",
+            headers=headers, params={"details": "treatment"}
+        )
+        if http_client.is_upstream_failure(details_response):
+            raise ServiceDegraded("Disease identification service unavailable")
+        if details_response.status_code != 200:
+            raise DiseaseAPIError("Failed to fetch treatment details")
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        raise _degraded(e, "Disease identification service unavailable")
+
+    treatment_details = details_response.json()
+
+    # Step 3: Process Disease Suggestion
+    disease_suggestions = treatment_details["result"]["disease"]["suggestions"]
+    highest_disease = max(disease_suggestions, key=lambda x: x["probability"])
+    treatment_info = highest_disease.get("details", {}).get("treatment", {})
+
+    return {
+        "name": highest_disease["name"],
+        "scientific_name": highest_disease.get("scientific_name", "N/A"),
+        "probability": highest_disease["probability"],
+        "treatment": {
+            "prevention": treatment_info.get("prevention", []),
+            "chemical": treatment_info.get("chemical treatment", []),
+            "biological": treatment_info.get("biological treatment", [])
+        }
+    }
+
+
+async def crop_disease_api_identify(filename: str, content: bytes, content_type: str) -> dict:
+    """Identify a crop disease with the service configured by CROP_DISEASE_API_URL."""
+    files = {"image": (filename, content, content_type)}
+    headers = {"Authorization": f"Bearer {CROP_DISEASE_API_KEY}"}
+
+    try:
+        response = await http_client.request(
+            "crop_disease_api", "POST", CROP_DISEASE_API_URL, files=files, headers=headers
+        )
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        raise _degraded(e, f"Error calling crop disease API: {str(e)}")
+
+    if http_client.is_upstream_failure(response):
+        raise ServiceDegraded(f"Error from crop disease API: {response.text}")
+    if response.status_code != 200:
+        raise DiseaseAPIError(f"Error from crop disease API: {response.text}", status_code=response.status_code)
+
+    return response.json()
@@ -0,0 +1,119 @@
+# disease_cache.py - Content-hash cache for crop disease identification results
+# Farmers often re-upload the same leaf photo. Results are keyed by the SHA-256
+# of the image bytes and the provider that produced them, kept in an in-memory
+# LRU in front of the disease_identification_cache table. While an upstream is
+# degraded, an expired entry for the same image is served rather than failing.
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import metrics
+from cache import TTLCache
+from disease_api import ServiceDegraded
+from models import DiseaseIdentificationCache
+
+load_dotenv()
+
+DISEASE_CACHE_TTL_SECONDS = float(os.getenv("DISEASE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+memory_cache = TTLCache(
+    maxsize=int(os.getenv("DISEASE_CACHE_MEMORY_SIZE", "512")),
+    ttl=DISEASE_CACHE_TTL_SECONDS,
+)
+metrics.register("disease_result_cache", memory_cache.stats)
+
+
+def image_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+async def get_cached_result(db: AsyncSession, provider: str, digest: str, allow_stale: bool = False) -> Optional[dict]:
+    """Return a cached result that is younger than the TTL (or of any age with allow_stale), or None."""
+    key = (provider, digest)
+    result = memory_cache.get(key, None)
+    if result is not None:
+        return result
+
+    query = select(DiseaseIdentificationCache.result, DiseaseIdentificationCache.created_at).where(
+        DiseaseIdentificationCache.provider == provider,
+        DiseaseIdentificationCache.image_sha256 == digest,
+    )
+    if not allow_stale:
+        cutoff = datetime.utcnow() - timedelta(seconds=DISEASE_CACHE_TTL_SECONDS)
+        query = query.where(DiseaseIdentificationCache.created_at >= cutoff)
+    row = (await db.execute(query)).first()
+    if row is None:
+        return None
+    if not allow_stale:
+        # Keep it in memory only for what is left of the row's own TTL
+        age = (datetime.utcnow() - row.created_at).total_seconds()
+        memory_cache.set(key, row.result, ttl=max(0.0, DISEASE_CACHE_TTL_SECONDS - age))
+    return row.result
+
+
+async def store_result(db: AsyncSession, provider: str, digest: str, result: dict):
+    """Persist a fresh result, replacing any expired entry for the same image."""
+    memory_cache.set((provider, digest), result)
+
+    existing = await db.execute(
+        select(DiseaseIdentificationCache).where(
+            DiseaseIdentificationCache.provider == provider,
+            DiseaseIdentificationCache.image_sha256 == digest,
+        )
+    )
+    entry = existing.scalars().first()
+    if entry is None:
+        db.add(DiseaseIdentificationCache(
+            provider=provider, image_sha256=digest, result=result, created_at=datetime.utcnow()
+        ))
+    else:
+        entry.result = result
+        entry.created_at = datetime.utcnow()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request stored the same image first; its result is as good
+        await db.rollback()
+
+
+async def identify_with_cache(
+    db: AsyncSession,
+    provider: str,
+    content: bytes,
+    identify: Callable[[], Awaitable[dict]],
+) -> dict:
+    """
+    Return the cached result for ``content`` or call ``identify`` and cache it.
+
+    Args:
+        db: Session used for the persistent cache table
+        provider: Name of the identification service
+        content: Raw image bytes
+        identify: Coroutine function calling the service on a cache miss
+
+    Raises:
+        ServiceDegraded: The service is unavailable and no result, even expired, is cached
+    """
+    digest = image_digest(content)
+    cached = await get_cached_result(db, provider, digest)
+    if cached is not None:
+        return cached
+    # End the lookup's transaction so no pooled connection is held during the
+    # upstream call; commit rather than rollback keeps the caller's objects loaded
+    await db.commit()
+
+    try:
+        result = await identify()
+    except ServiceDegraded:
+        stale = await get_cached_result(db, provider, digest, allow_stale=True)
+        if stale is None:
+            raise
+        return stale
+    await store_result(db, provider, digest, result)
+    return result
@@ -0,0 +1,108 @@
+# events.py - In-process publish/subscribe for real-time notifications
+# Routers publish events to topics after their transaction commits; streaming
+# endpoints subscribe to the topics a user may see. Everything goes through
+# `broker`, so a networked broker (Redis, NATS, ...) can replace EventBroker
+# for multi-process deployments without touching publishers or subscribers.
+import asyncio
+import os
+from typing import Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+EVENT_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE_SIZE", "100"))
+
+# Sent in place of events a slow subscriber missed; clients should refetch
+RESYNC_EVENT = {"type": "resync"}
+
+
+def user_topic(username: str) -> str:
+    return f"user:{username}"
+
+
+class Subscription:
+    """Bounded queue of events for one subscriber; use as an async context manager."""
+
+    def __init__(self, broker: "EventBroker", topics: Set[str], max_queued: int):
+        self.broker = broker
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.overflowed = False
+
+    def deliver(self, event: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog rather than grow without bound; one resync replaces it
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+            self.broker.dropped += 1
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None if none arrives within ``timeout`` seconds."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is RESYNC_EVENT:
+            self.overflowed = False
+        return event
+
+    async def __aenter__(self):
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.broker._remove(self)
+
+
+class EventBroker:
+    """Fans each published event out to every subscription on its topic, in this process only."""
+
+    def __init__(self, max_queued: int = EVENT_SUBSCRIBER_QUEUE_SIZE):
+        self.max_queued = max_queued
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, *topics: str) -> Subscription:
+        return Subscription(self, set(topics), self.max_queued)
+
+    def publish(self, topic: str, event: dict):
+        """Deliver ``event`` to current subscribers of ``topic`` without waiting on them."""
+        self.published += 1
+        for subscription in self._subscriptions.get(topic, ()):
+            subscription.deliver(event)
+            self.delivered += 1
+
+    def _add(self, subscription: Subscription):
+        for topic in subscription.topics:
+            self._subscriptions.setdefault(topic, set()).add(subscription)
+
+    def _remove(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscriptions.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[topic]
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": len({s for subs in self._subscriptions.values() for s in subs}),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+broker = EventBroker()
+metrics.register("event_broker", broker.stats)
@@ -0,0 +1,123 @@
+import math
+from typing import List, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Precision stored on Farm.geohash (~5m cells); searches use shorter prefixes
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Encode a coordinate as a geohash string.
+
+    Nearby points share a common prefix, so a B-tree index on the geohash
+    column turns "points inside this cell" into an index range scan.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits, bit_count, even = 0, 0, True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+
+    return "".join(geohash)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """Return the (height, width) of a geohash cell in degrees."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two coordinates in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _half_extents(latitude: float, radius_km: float) -> Tuple[float, float]:
+    """
+    Return the (latitude, longitude) half-extents in degrees of a circle on the sphere.
+
+    The widest longitude span of a circle lies poleward of its centre, so it
+    is taken from asin(sin(r) / cos(lat)) rather than r / cos(lat).
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angular)
+    sin_r, cos_lat = math.sin(min(angular, math.pi / 2)), math.cos(math.radians(latitude))
+    if angular >= math.pi / 2 or sin_r >= cos_lat:
+        return d_lat, 180.0
+    return d_lat, math.degrees(math.asin(sin_r / cos_lat))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle.
+
+    Longitude bounds are clamped to [-180, 180] rather than wrapped, and widen
+    to the full range near the poles.
+    """
+    d_lat, d_lng = _half_extents(latitude, radius_km)
+    return (
+        max(-90.0, latitude - d_lat),
+        min(90.0, latitude + d_lat),
+        max(-180.0, longitude - d_lng),
+        min(180.0, longitude + d_lng),
+    )
+
+
+def covering_prefixes(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """
+    Return geohash prefixes whose cells together cover the search circle.
+
+    Picks the longest prefix whose cells are at least ``radius_km`` across,
+    then takes the cell containing the centre and its eight neighbours. An
+    empty list means the radius is too large for prefix pruning to help.
+    """
+    d_lat, d_lng = _half_extents(latitude, radius_km)
+    precision = 0
+    for candidate in range(1, GEOHASH_PRECISION + 1):
+        cell_lat, cell_lng = geohash_cell_size(candidate)
+        if cell_lat < d_lat or cell_lng < d_lng:
+            break
+        precision = candidate
+
+    if precision == 0:
+        return []
+
+    cell_lat, cell_lng = geohash_cell_size(precision)
+    prefixes = set()
+    for d_lat in (-1, 0, 1):
+        for d_lng in (-1, 0, 1):
+            lat = min(90.0, max(-90.0, latitude + d_lat * cell_lat))
+            lng = (longitude + d_lng * cell_lng + 180.0) % 360.0 - 180.0
+            prefixes.add(encode_geohash(lat, lng, precision))
+    return sorted(prefixes)
@@ -0,0 +1,140 @@
+# http_client.py - Shared async HTTP client for external API integrations
+# One httpx.AsyncClient lives for the whole application so TCP/TLS connections
+# are pooled and kept alive across requests. Each upstream service also gets
+# its own concurrency limit so one slow provider cannot take every connection,
+# and calls go through that upstream's circuit breaker (see resilience.py).
+import asyncio
+import os
+from typing import Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+import metrics
+from resilience import backoff_delay, get_breaker, retry_budget
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# Default in-flight request limit per upstream; override with <NAME>_MAX_CONCURRENCY
+DEFAULT_UPSTREAM_CONCURRENCY = int(os.getenv("HTTP_UPSTREAM_MAX_CONCURRENCY", "10"))
+
+# Retries of transport errors, 429 and 5xx responses, drawn from the shared retry budget
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_RETRY_BACKOFF_BASE = float(os.getenv("HTTP_RETRY_BACKOFF_BASE", "0.2"))
+HTTP_RETRY_BACKOFF_CAP = float(os.getenv("HTTP_RETRY_BACKOFF_CAP", "2"))
+
+_client: Optional[httpx.AsyncClient] = None
+_limits: Dict[str, asyncio.Semaphore] = {}
+_in_flight: Dict[str, int] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client; called on application shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _upstream_limit(upstream: str) -> asyncio.Semaphore:
+    if upstream not in _limits:
+        limit = int(os.getenv(f"{upstream.upper()}_MAX_CONCURRENCY", DEFAULT_UPSTREAM_CONCURRENCY))
+        _limits[upstream] = asyncio.Semaphore(limit)
+        _in_flight[upstream] = 0
+    return _limits[upstream]
+
+
+def is_upstream_failure(response: httpx.Response) -> bool:
+    """True for responses that signal an overloaded or broken upstream."""
+    return response.status_code == 429 or response.status_code >= 500
+
+
+# Failures after which a request that must not be repeated is known not to have been processed
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+_NOT_PROCESSED_STATUSES = (429, 503)
+
+
+async def _send(upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+    async with _upstream_limit(upstream):
+        _in_flight[upstream] += 1
+        try:
+            return await get_client().request(method, url, **kwargs)
+        finally:
+            _in_flight[upstream] -= 1
+
+
+async def request(upstream: str, method: str, url: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+    """
+    Send a request to an upstream service through the shared client.
+
+    Transport errors, 429 and 5xx responses count as failures for the
+    upstream's circuit breaker and are retried with jittered backoff while
+    the retry budget allows; the last response or error is then returned.
+
+    Args:
+        upstream: Name of the upstream service, used for its concurrency limit and breaker
+        method: HTTP method
+        url: Absolute URL
+        idempotent: False for calls that must not run twice, such as paid submissions;
+            those are only retried after connect errors and 429/503 responses
+        **kwargs: Passed through to httpx.AsyncClient.request
+
+    Returns:
+        The httpx response; transport errors and timeouts raise httpx.HTTPError
+
+    Raises:
+        CircuitOpenError: The upstream's breaker is open, so no request was sent
+    """
+    breaker = get_breaker(upstream)
+    retry_budget.record_request()
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            response = await _send(upstream, method, url, **kwargs)
+        except httpx.HTTPError as e:
+            breaker.record(success=False)
+            retryable = idempotent or isinstance(e, _NOT_SENT_ERRORS)
+            if not retryable or attempt >= HTTP_MAX_RETRIES or not retry_budget.try_spend():
+                raise
+        except BaseException:
+            # Cancelled or broken by something other than the upstream; free a half-open probe slot
+            breaker.release()
+            raise
+        else:
+            failed = is_upstream_failure(response)
+            breaker.record(success=not failed)
+            retryable = idempotent or response.status_code in _NOT_PROCESSED_STATUSES
+            if not failed or not retryable or attempt >= HTTP_MAX_RETRIES or not retry_budget.try_spend():
+                return response
+        attempt += 1
+        await asyncio.sleep(backoff_delay(attempt, HTTP_RETRY_BACKOFF_BASE, HTTP_RETRY_BACKOFF_CAP))
+
+
+def stats() -> dict:
+    """In-flight requests per upstream for the metrics endpoint."""
+    return {"in_flight": dict(_in_flight)}
+
+
+metrics.register("http_client", stats)
@@ -0,0 +1,161 @@
+# image_variants.py - Resized WebP/AVIF derivatives of uploaded images
+# Listing cards only need a small image, so every stored original gets
+# thumbnail and medium variants in the formats the installed Pillow can
+# encode. Variants are rendered on a bounded thread pool, written next to
+# each other under media/variants/ and reused on every later request.
+# Pillow is optional; without it no variants are advertised.
+import asyncio
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from utils import MEDIA_DIR
+from workers import BoundedExecutor, ExecutorSaturated
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+VARIANTS_DIR = MEDIA_DIR / "variants"
+
+# Longest edge in pixels for each variant; originals are never upscaled
+VARIANT_SIZES = {"thumb": 320, "medium": 960}
+VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+
+variant_executor = BoundedExecutor(
+    "image_variant_executor",
+    max_workers=int(os.getenv("IMAGE_VARIANT_WORKERS", "2")),
+    max_pending=int(os.getenv("IMAGE_VARIANT_MAX_PENDING", "64")),
+)
+
+# Renders in progress, so concurrent requests for one variant share the work
+_in_progress: Dict[Path, asyncio.Future] = {}
+# Upload-time render tasks, referenced until they finish
+_background = set()
+
+
+def _available_formats() -> List[str]:
+    try:
+        from PIL import features
+    except ImportError:
+        return []
+    formats = []
+    for fmt in ("avif", "webp"):
+        try:
+            if features.check(fmt):
+                formats.append(fmt)
+        except ValueError:
+            # Older Pillow releases do not know the feature at all
+            pass
+    return formats
+
+
+VARIANT_FORMATS = _available_formats()
+
+
+def variant_urls(image_url: str) -> Dict[str, str]:
+    """
+    URLs of every variant of a stored image, keyed "<size>_<format>".
+
+    Args:
+        image_url: Path of the original as stored in the database, e.g. /media/farm_images/x.png
+    """
+    relative = image_url.lstrip("/")
+    prefix = f"{MEDIA_DIR.as_posix()}/"
+    if not relative.startswith(prefix):
+        return {}
+    relative = relative[len(prefix):]
+    return {
+        f"{size}_{fmt}": f"/api/media/variants/{size}/{fmt}/{relative}"
+        for size in VARIANT_SIZES
+        for fmt in VARIANT_FORMATS
+    }
+
+
+def thumbnail_url(image_url: str) -> Optional[str]:
+    """Smallest variant in the most widely supported format, or None without Pillow."""
+    urls = variant_urls(image_url)
+    for fmt in ("webp", "avif"):
+        url = urls.get(f"thumb_{fmt}")
+        if url:
+            return url
+    return None
+
+
+def variant_path(size: str, fmt: str, relative: str) -> Path:
+    return VARIANTS_DIR / size / fmt / Path(relative).with_suffix(f".{fmt}")
+
+
+def _render(source: Path, target: Path, max_edge: int, fmt: str):
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f".{uuid.uuid4()}.part")
+        try:
+            image.save(temp, format=fmt.upper(), quality=VARIANT_QUALITY)
+            os.replace(temp, target)
+        finally:
+            temp.unlink(missing_ok=True)
+
+
+async def get_variant(size: str, fmt: str, relative: str) -> Path:
+    """
+    Return the path of a variant, rendering and caching it on first use.
+
+    Raises:
+        FileNotFoundError: The original does not exist
+        ExecutorSaturated: Too many renders are already queued
+    """
+    target = variant_path(size, fmt, relative)
+    if target.exists():
+        return target
+
+    source = MEDIA_DIR / relative
+    if not source.is_file():
+        raise FileNotFoundError(relative)
+
+    pending = _in_progress.get(target)
+    if pending is None:
+        pending = asyncio.ensure_future(
+            variant_executor.run(_render, source, target, VARIANT_SIZES[size], fmt)
+        )
+        _in_progress[target] = pending
+        pending.add_done_callback(lambda _: _in_progress.pop(target, None))
+    await asyncio.shield(pending)
+    return target
+
+
+def schedule_variants(image_url: str):
+    """Render every variant of a new upload in the background; failures are left for lazy rendering."""
+    relative = image_url.lstrip("/")[len(f"{MEDIA_DIR.as_posix()}/"):]
+
+    async def render_all():
+        for size in VARIANT_SIZES:
+            for fmt in VARIANT_FORMATS:
+                try:
+                    await get_variant(size, fmt, relative)
+                except ExecutorSaturated:
+                    return
+                except Exception:
+                    logger.exception("Could not render %s %s variant of %s", size, fmt, image_url)
+
+    if VARIANT_FORMATS:
+        task = asyncio.create_task(render_all())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+
+def remove_variants(relative: str):
+    """Delete every rendered variant of an original that is being removed."""
+    for size in VARIANT_SIZES:
+        for fmt in ("avif", "webp"):
+            variant_path(size, fmt, relative).unlink(missing_ok=True)
@@ -8,7 +8,13 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 
-from routers import auth, user, farm, bid, schemes, crop_health
+from routers import auth, user, farm, bid, schemes, crop_health, media
+from database import dispose_engines, log_engine_settings
+import metrics
+from workers import shutdown_executors
+import http_client
+import detectors
+import media_store
 
 # Initialize environment variables from .env file
 # Critical for secure credential management in development and production
@@ -50,10 +56,34 @@ app.include_router(farm.router)
 app.include_router(bid.router)
 app.include_router(schemes.router)
 app.include_router(crop_health.router)
+app.include_router(media.router)
+
+# Report effective pool and SQLite settings so deployments can verify sizing,
+# then load the disease detector and start the background workers
+@app.on_event("startup")
+async def startup():
+    log_engine_settings()
+    await detectors.start_detector()
+    await crop_health.start_analysis_jobs()
+    await media_store.start_media_cleanup()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await crop_health.analysis_queue.stop()
+    await media_store.stop_media_cleanup()
+    await detectors.stop_detector()
+    shutdown_executors()
+    await http_client.close_client()
+    await dispose_engines()
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to AgroTech API"}
 
+# Process-local counters (caches, pools) for monitoring
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
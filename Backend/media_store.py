@@ -0,0 +1,264 @@
+# media_store.py - Reference-aware cleanup of stored images
+# Uploads are content-addressed (utils.object_path), so one file can back many
+# FarmImage and CropHealthRecord rows. A file is only removed once no row
+# references it: release_media() runs right after a delete commits, and
+# sweep() collects anything missed, e.g. from a crash between the two.
+# schedule_release() hands the work to a background worker that retries
+# failed deletions and re-checks files still in their grace period, so
+# requests do not wait on the filesystem. The app also sweeps periodically.
+#
+# Usage: python media_store.py sweep [--dry-run]
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, engine
+from image_variants import VARIANTS_DIR, remove_variants
+from models import FarmImage, CropHealthRecord
+from utils import MEDIA_DIR, OBJECTS_DIR, UPLOAD_CHUNK_SIZE, StoredFile, detect_image_type, media_url, object_path
+from workers import JobQueue, ExecutorSaturated
+
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+# Files modified more recently than this are never collected; a concurrent
+# upload of the same content may be about to reference them
+MEDIA_GC_GRACE_SECONDS = float(os.getenv("MEDIA_GC_GRACE_SECONDS", "3600"))
+MEDIA_CLEANUP_MAX_ATTEMPTS = int(os.getenv("MEDIA_CLEANUP_MAX_ATTEMPTS", "5"))
+MEDIA_CLEANUP_RETRY_SECONDS = float(os.getenv("MEDIA_CLEANUP_RETRY_SECONDS", "5"))
+# Seconds between sweeps run by the application; 0 leaves sweeping to the CLI
+MEDIA_SWEEP_INTERVAL_SECONDS = float(os.getenv("MEDIA_SWEEP_INTERVAL_SECONDS", "21600"))
+
+REFERENCE_COLUMNS = (FarmImage.image_url, CropHealthRecord.image_path)
+
+
+def _relative_to_media(url: str) -> Optional[str]:
+    relative = url.lstrip("/")
+    prefix = f"{MEDIA_DIR.as_posix()}/"
+    return relative[len(prefix):] if relative.startswith(prefix) else None
+
+
+def remove_media(url: str):
+    """Delete a stored file and its rendered variants; raises OSError on failure."""
+    Path(url.lstrip("/")).unlink(missing_ok=True)
+    relative = _relative_to_media(url)
+    if relative is not None:
+        remove_variants(relative)
+
+
+def _grace_remaining(path: Path, grace: float) -> float:
+    """Seconds until ``path`` leaves the grace period; 0 if it is older or gone."""
+    try:
+        return max(0.0, grace - (time.time() - path.stat().st_mtime))
+    except FileNotFoundError:
+        return 0.0
+
+
+async def is_referenced(db: AsyncSession, url: str) -> bool:
+    for column in REFERENCE_COLUMNS:
+        found = await db.execute(select(column).where(column == url).limit(1))
+        if found.first() is not None:
+            return True
+    return False
+
+
+async def release_media(db: AsyncSession, urls: Iterable[str]) -> Dict[str, float]:
+    """
+    Delete files whose last referencing row is gone.
+
+    Call after the transaction that deleted the rows has committed. Files
+    modified within the grace period are kept.
+
+    Returns:
+        The kept files' URLs mapped to the seconds left in their grace period
+    """
+    deferred = {}
+    for url in set(urls):
+        if not url or await is_referenced(db, url):
+            continue
+        remaining = await asyncio.to_thread(_grace_remaining, Path(url.lstrip("/")), MEDIA_GC_GRACE_SECONDS)
+        if remaining > 0:
+            deferred[url] = remaining
+            continue
+        await asyncio.to_thread(remove_media, url)
+    return deferred
+
+
+async def _cleanup_job(job):
+    url, attempt = job
+    loop = asyncio.get_running_loop()
+    try:
+        async with AsyncSessionLocal() as db:
+            deferred = await release_media(db, [url])
+    except Exception:
+        if attempt >= MEDIA_CLEANUP_MAX_ATTEMPTS:
+            logger.exception("Giving up on removing %s; the media sweep will collect it", url)
+            return
+        delay = MEDIA_CLEANUP_RETRY_SECONDS * 2 ** (attempt - 1)
+        logger.warning("Removing %s failed (attempt %d), retrying in %.0fs", url, attempt, delay)
+        loop.call_later(delay, _submit, url, attempt + 1)
+        return
+    # Check files still in their grace period again once it has passed
+    for deferred_url, remaining in deferred.items():
+        loop.call_later(remaining, _submit, deferred_url, attempt)
+
+
+cleanup_queue = JobQueue(
+    "media_cleanup_jobs",
+    handler=_cleanup_job,
+    workers=int(os.getenv("MEDIA_CLEANUP_WORKERS", "1")),
+    max_queued=int(os.getenv("MEDIA_CLEANUP_QUEUE_SIZE", "10000")),
+)
+
+
+def _submit(url: str, attempt: int):
+    try:
+        cleanup_queue.submit((url, attempt))
+    except (ExecutorSaturated, RuntimeError):
+        # Queue full or shutting down; the file stays until the next sweep
+        logger.warning("Could not queue removal of %s; the media sweep will collect it", url)
+
+
+def schedule_release(urls: Iterable[str]):
+    """Queue release_media() for each URL on the background cleanup worker."""
+    for url in set(urls):
+        if url:
+            _submit(url, 1)
+
+
+def discard_uploads(stored_files: Iterable[StoredFile]):
+    """
+    Release files written for records that were never saved, e.g. after a rollback.
+
+    Files whose content was already stored before the upload are left alone.
+    The others go through the cleanup worker like any release, so they are
+    only removed after the grace period and if no row references them by then:
+    a concurrent upload of the same bytes may be about to save one.
+    """
+    schedule_release(media_url(stored.path) for stored in stored_files if stored.created)
+
+
+def _sweep_database() -> List[str]:
+    with engine.connect() as connection:
+        return sweep(connection)
+
+
+async def _sweep_periodically():
+    while True:
+        await asyncio.sleep(MEDIA_SWEEP_INTERVAL_SECONDS)
+        try:
+            removed = await asyncio.to_thread(_sweep_database)
+        except Exception:
+            logger.exception("Media sweep failed")
+            continue
+        if removed:
+            logger.info("Media sweep removed %d unreferenced file(s)", len(removed))
+
+
+_sweeper: Optional[asyncio.Task] = None
+
+
+async def start_media_cleanup():
+    """Start the cleanup worker and the periodic sweep; called on application startup."""
+    global _sweeper
+    await cleanup_queue.start()
+    if MEDIA_SWEEP_INTERVAL_SECONDS > 0:
+        _sweeper = asyncio.create_task(_sweep_periodically())
+
+
+async def stop_media_cleanup():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+        _sweeper = None
+    await cleanup_queue.stop()
+
+
+def ingest_file(source: Path) -> Optional[str]:
+    """
+    Copy an existing file into content-addressed storage and return its URL.
+
+    The source is left in place. Returns None if it does not exist.
+    """
+    if not source.is_file():
+        return None
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        header = f.read(16)
+        f.seek(0)
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    target = object_path(digest.hexdigest(), detect_image_type(header) or source.suffix.lower())
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = OBJECTS_DIR / f".{uuid.uuid4()}.part"
+        shutil.copyfile(source, temp)
+        os.replace(temp, target)
+    return media_url(target)
+
+
+def sweep(connection, grace: float = MEDIA_GC_GRACE_SECONDS, dry_run: bool = False) -> List[str]:
+    """
+    Remove content-addressed files no row references, plus abandoned partial uploads.
+
+    Args:
+        connection: Sync SQLAlchemy connection
+        grace: Only files older than this many seconds are removed
+        dry_run: Report what would be removed without deleting anything
+
+    Returns:
+        URLs of the removed files
+    """
+    referenced = set()
+    for column in REFERENCE_COLUMNS:
+        referenced.update(connection.execute(select(column).distinct()).scalars())
+
+    cutoff = time.time() - grace
+    removed = []
+    if OBJECTS_DIR.is_dir():
+        for path in OBJECTS_DIR.rglob("*"):
+            if not path.is_file() or path.stat().st_mtime > cutoff:
+                continue
+            url = media_url(path)
+            if url in referenced:
+                continue
+            if not dry_run:
+                remove_media(url)
+            removed.append(url)
+
+    # Variants whose original was removed some other way
+    if VARIANTS_DIR.is_dir():
+        for path in VARIANTS_DIR.glob(f"*/*/{OBJECTS_DIR.name}/**/*"):
+            if not path.is_file() or path.stat().st_mtime > cutoff:
+                continue
+            original_dir = MEDIA_DIR.joinpath(*path.relative_to(VARIANTS_DIR).parts[2:-1])
+            if not any(original_dir.glob(f"{path.stem}.*")):
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+                removed.append(media_url(path))
+    return removed
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["sweep"]:
+        print("Usage: python media_store.py sweep [--dry-run]")
+        sys.exit(1)
+    dry_run = "--dry-run" in sys.argv
+    with engine.connect() as connection:
+        removed = sweep(connection, dry_run=dry_run)
+    for url in removed:
+        print(("would remove " if dry_run else "removed ") + url)
+    print(f"{len(removed)} file(s) {'unreferenced' if dry_run else 'removed'}")
@@ -0,0 +1,19 @@
+from typing import Callable, Dict
+
+# Named callables returning a JSON-serializable dict of counters.
+# Modules register their own stats; GET /metrics reports them all.
+_providers: Dict[str, Callable[[], dict]] = {}
+
+def register(name: str, provider: Callable[[], dict]):
+    """
+    Register a stats provider under a unique name.
+
+    Args:
+        name: Key the stats appear under in the metrics response
+        provider: Zero-argument callable returning the current counters
+    """
+    _providers[name] = provider
+
+def snapshot() -> dict:
+    """Collect the current counters from every registered provider."""
+    return {name: provider() for name, provider in _providers.items()}
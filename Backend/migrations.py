@@ -0,0 +1,197 @@
+# migrations.py - Versioned schema migrations for existing databases
+# Base.metadata.create_all only creates tables that are missing; it never adds
+# indexes or columns to tables that already exist. Each migration below brings
+# an existing database forward and is recorded in the schema_migrations table
+# so it runs exactly once.
+import logging
+
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, delete, func, inspect, literal, select, update
+from sqlalchemy.types import SchemaType
+
+from geo import encode_geohash
+from models import Farm, FarmImage, Bid, BidEvent, BidEventType, CropHealthRecord, CropHealthJobStatus
+from search import create_search_index, rebuild_search_index
+
+logger = logging.getLogger("uvicorn.error")
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    """Register a migration function that receives a sync Connection."""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def create_indexes(connection, table, *names):
+    """Create the named indexes declared on ``table`` unless they already exist."""
+    for index in table.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def add_column(connection, table, column_name):
+    """Add a column declared on ``table`` to the live table if it is missing."""
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    if column_name in existing:
+        return
+    column = table.c[column_name]
+    if isinstance(column.type, SchemaType):
+        # Named types such as PostgreSQL enums must exist before a column can use them
+        column.type.create(connection, checkfirst=True)
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_name} {column_type}")
+
+
+@migration(1, "Composite indexes for farm and bid access paths")
+def add_access_path_indexes(connection):
+    create_indexes(
+        connection, Farm.__table__,
+        "ix_farms_farmer_username", "ix_farms_crop_type_status_organic", "ix_farms_status_organic",
+    )
+    create_indexes(connection, FarmImage.__table__, "ix_farm_images_farm_id")
+    create_indexes(connection, Bid.__table__, "ix_bids_farm_company_status", "ix_bids_company_status")
+
+
+@migration(2, "Geohash column and index for proximity search")
+def add_farm_geohash(connection):
+    farms = Farm.__table__
+    add_column(connection, farms, "geohash")
+    create_indexes(connection, farms, "ix_farms_geohash")
+
+    rows = connection.execute(
+        select(farms.c.id, farms.c.latitude, farms.c.longitude)
+        .where(farms.c.latitude.isnot(None), farms.c.longitude.isnot(None), farms.c.geohash.is_(None))
+    ).all()
+    for row in rows:
+        connection.execute(
+            update(farms).where(farms.c.id == row.id).values(geohash=encode_geohash(row.latitude, row.longitude))
+        )
+
+
+@migration(3, "Full-text search index over farm location, crop and pesticides")
+def add_farm_search_index(connection):
+    create_search_index(connection)
+    rebuild_search_index(connection)
+
+
+@migration(4, "Background job state for crop health analyses")
+def add_crop_health_job_state(connection):
+    records = CropHealthRecord.__table__
+    for column_name in ("status", "result", "error", "completed_at"):
+        add_column(connection, records, column_name)
+    create_indexes(connection, records, "ix_crop_health_records_status")
+    connection.execute(
+        update(records).where(records.c.status.is_(None)).values(status=CropHealthJobStatus.COMPLETED)
+    )
+
+
+@migration(5, "Indexes for media reference checks")
+def add_media_reference_indexes(connection):
+    create_indexes(connection, FarmImage.__table__, "ix_farm_images_image_url")
+    create_indexes(connection, CropHealthRecord.__table__, "ix_crop_health_records_image_path")
+
+
+@migration(6, "Remove bids and farm images orphaned by earlier farm deletions")
+def remove_orphaned_farm_rows(connection):
+    farm_ids = select(Farm.__table__.c.id)
+    for table in (Bid.__table__, FarmImage.__table__):
+        connection.execute(delete(table).where(table.c.farm_id.not_in(farm_ids)))
+
+
+@migration(7, "Sold farm status")
+def add_farm_sold_status(connection):
+    # SQLite stores the enum as a plain string; PostgreSQL's native enum type needs the new value
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("ALTER TYPE farmstatusenum ADD VALUE IF NOT EXISTS 'SOLD'")
+
+
+@migration(8, "Start the bid history with the current state of every bid")
+def backfill_bid_events(connection):
+    bids, events = Bid.__table__, BidEvent.__table__
+    connection.execute(
+        events.insert().from_select(
+            ["bid_id", "farm_id", "company_username", "event_type", "bid_amount", "status", "created_at"],
+            select(
+                bids.c.id, bids.c.farm_id, bids.c.company_username,
+                literal(BidEventType.CREATED, events.c.event_type.type), bids.c.bid_amount, bids.c.status, bids.c.bid_date
+            ).where(bids.c.id.not_in(select(events.c.bid_id)))
+        )
+    )
+
+
+@migration(9, "Keep bid history when a farm is deleted")
+def drop_bid_events_farm_foreign_key(connection):
+    # SQLite cannot drop constraints in place, and the app leaves its foreign keys unenforced
+    if connection.dialect.name == "sqlite":
+        return
+    for foreign_key in inspect(connection).get_foreign_keys("bid_events"):
+        if foreign_key["referred_table"] == "farms" and foreign_key["name"]:
+            connection.exec_driver_sql(f"ALTER TABLE bid_events DROP CONSTRAINT {foreign_key['name']}")
+
+
+@migration(10, "Never reuse farm ids on SQLite")
+def autoincrement_farm_ids(connection):
+    # SQLite hands out the highest deleted id again unless the key is AUTOINCREMENT,
+    # which needs the table rebuilt; other databases never reuse ids
+    if connection.dialect.name != "sqlite":
+        return
+    table_sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'farms'"
+    ).scalar()
+    if "AUTOINCREMENT" in table_sql.upper():
+        return
+    farms = Farm.__table__
+    # Legacy rename leaves the foreign keys of bids and farm_images pointing at "farms"
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    connection.exec_driver_sql("ALTER TABLE farms RENAME TO farms_old")
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    for index in farms.indexes:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    farms.create(connection)
+    columns = ", ".join(column.name for column in farms.columns)
+    connection.exec_driver_sql(f"INSERT INTO farms ({columns}) SELECT {columns} FROM farms_old")
+    connection.exec_driver_sql("DROP TABLE farms_old")
+
+
+@migration(11, "Order the bid history index by event id")
+def reindex_bid_events_by_id(connection):
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_bid_events_farm_created")
+    create_indexes(connection, BidEvent.__table__, "ix_bid_events_farm_id")
+
+
+def run_migrations(engine):
+    """Apply every registered migration not yet recorded in schema_migrations."""
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+        applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with engine.begin() as connection:
+            fn(connection)
+            connection.execute(schema_migrations.insert().values(version=version, description=description))
+        logger.info("Applied migration %s: %s", version, description)
+
+
+if __name__ == "__main__":
+    # Importing database creates missing tables and applies pending migrations
+    from database import engine
+
+    with engine.connect() as connection:
+        rows = connection.execute(select(schema_migrations).order_by(schema_migrations.c.version)).all()
+    for row in rows:
+        print(f"{row.version:>4}  {row.applied_at}  {row.description}")
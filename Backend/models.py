@@ -1,10 +1,13 @@
 # models.py - Database ORM models for the AgroTech application
 # Implements SQLAlchemy models with proper relationships and constraints
-from sqlalchemy import Column, Integer, String, Boolean, Float, Enum, ForeignKey, Date, DateTime, func
+from sqlalchemy import Column, Integer, String, Boolean, Float, Enum, ForeignKey, Date, DateTime, Index, JSON, event, func
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 import enum
 from datetime import date
 
+from geo import encode_geohash
+
 Base = declarative_base()
 
 class UserType(str, enum.Enum):
@@ -40,11 +43,14 @@ class User(Base):
     contact_person_designation = Column(String, nullable=True)
     company_gst_id = Column(String, nullable=True)  # File path to verification document
 
+    farms = relationship("Farm", back_populates="farmer")
+
 class FarmStatusEnum(str, enum.Enum):
     """Enumeration representing the current state of a farm's crop cycle"""
     EMPTY = "empty"
     GROWING = "growing"
     HARVESTED = "harvested"
+    SOLD = "sold"  # Set when the farmer accepts a bid
 
 class Farm(Base):
     """
@@ -58,6 +64,7 @@ class Farm(Base):
     farm_location = Column(String, nullable=False)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(String, nullable=True)  # Derived from latitude/longitude for proximity search
     farm_area = Column(Float, nullable=False)
     crop_type = Column(String, nullable=True)
     is_organic = Column(Boolean, default=False)
@@ -69,15 +76,48 @@ class Farm(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    # Relationships are loaded explicitly (selectinload) by the routers;
+    # passive_deletes leaves child rows to the database when a farm is deleted
+    farmer = relationship("User", back_populates="farms")
+    images = relationship("FarmImage", back_populates="farm", passive_deletes=True)
+    bids = relationship("Bid", back_populates="farm", passive_deletes=True)
+
+    # Access paths used by get_farms, get_my_farms and the farmer branch of get_bids
+    __table_args__ = (
+        Index("ix_farms_farmer_username", "farmer_username"),
+        Index("ix_farms_crop_type_status_organic", "crop_type", "farm_status", "is_organic"),
+        Index("ix_farms_status_organic", "farm_status", "is_organic"),
+        Index("ix_farms_geohash", "geohash"),
+        # Bid history is kept by farm id after a farm is deleted, so ids must never be reused
+        {"sqlite_autoincrement": True},
+    )
+
+@event.listens_for(Farm, "before_insert")
+@event.listens_for(Farm, "before_update")
+def _sync_farm_geohash(mapper, connection, farm):
+    """Keep the geohash column in step with the farm coordinates"""
+    if farm.latitude is not None and farm.longitude is not None:
+        farm.geohash = encode_geohash(float(farm.latitude), float(farm.longitude))
+    else:
+        farm.geohash = None
+
 class FarmImage(Base):
     """Storage model for farm images to facilitate visual verification and analysis"""
     __tablename__ = "farm_images"
     
     id = Column(Integer, primary_key=True, index=True)
-    farm_id = Column(Integer, ForeignKey("farms.id"), nullable=False)
+    farm_id = Column(Integer, ForeignKey("farms.id", ondelete="CASCADE"), nullable=False)
     image_url = Column(String, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
 
+    farm = relationship("Farm", back_populates="images")
+
+    __table_args__ = (
+        Index("ix_farm_images_farm_id", "farm_id"),
+        # Reference checks before a shared, content-addressed file is deleted
+        Index("ix_farm_images_image_url", "image_url"),
+    )
+
 class BidStatusEnum(str, enum.Enum):
     """Status tracking for the bidding workflow process"""
     PENDING = "pending"
@@ -92,13 +132,54 @@ class Bid(Base):
     __tablename__ = "bids"
     
     id = Column(Integer, primary_key=True, index=True)
-    farm_id = Column(Integer, ForeignKey("farms.id"), nullable=False)
+    farm_id = Column(Integer, ForeignKey("farms.id", ondelete="CASCADE"), nullable=False)
     company_username = Column(String, ForeignKey("users.username"), nullable=False)
     bid_amount = Column(Float, nullable=False)
     bid_date = Column(DateTime, server_default=func.now())
     status = Column(Enum(BidStatusEnum), default=BidStatusEnum.PENDING, nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    farm = relationship("Farm", back_populates="bids")
+    company = relationship("User")
+
+    # Duplicate-pending check in create_bid and per-farm / per-company listings
+    __table_args__ = (
+        Index("ix_bids_farm_company_status", "farm_id", "company_username", "status"),
+        Index("ix_bids_company_status", "company_username", "status"),
+    )
+
+class BidEventType(str, enum.Enum):
+    """Kinds of change recorded in a bid's history"""
+    CREATED = "created"
+    AMOUNT_CHANGED = "amount_changed"
+    STATUS_CHANGED = "status_changed"
+    WITHDRAWN = "withdrawn"
+
+class BidEvent(Base):
+    """
+    Append-only history of bid changes, written in the same transaction as the change.
+    Rows are never updated; bid_id and farm_id are not foreign keys so history
+    outlives withdrawn bids and deleted farms.
+    """
+    __tablename__ = "bid_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bid_id = Column(Integer, nullable=False)
+    farm_id = Column(Integer, nullable=False)
+    company_username = Column(String, nullable=False)
+    event_type = Column(Enum(BidEventType), nullable=False)
+    # State of the bid after the change, and what changed
+    bid_amount = Column(Float, nullable=False)
+    status = Column(Enum(BidStatusEnum), nullable=False)
+    previous_amount = Column(Float, nullable=True)
+    previous_status = Column(Enum(BidStatusEnum), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    # Price timeline per farm; ids follow insertion order, so this index serves the timeline's ORDER BY
+    __table_args__ = (
+        Index("ix_bid_events_farm_id", "farm_id", "id"),
+    )
+
 class GovScheme(Base):
     """
     Government scheme entity for agricultural support programs.
@@ -114,6 +195,13 @@ class GovScheme(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+class CropHealthJobStatus(str, enum.Enum):
+    """Progress of a disease analysis submitted for background processing"""
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class CropHealthRecord(Base):
     """
     Stores disease detection results and associated metadata.
@@ -129,3 +217,31 @@ class CropHealthRecord(Base):
     confidence_score = Column(Float, nullable=True)
     timestamp = Column(DateTime, server_default=func.now())
     notes = Column(String, nullable=True)
+
+    # Background analysis state; records created synchronously are completed on insert
+    status = Column(Enum(CropHealthJobStatus), default=CropHealthJobStatus.COMPLETED)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_crop_health_records_status", "status"),
+        Index("ix_crop_health_records_image_path", "image_path"),
+    )
+
+class DiseaseIdentificationCache(Base):
+    """
+    Identification results keyed by the SHA-256 of the submitted image bytes.
+    Lets duplicate uploads skip the paid external API.
+    """
+    __tablename__ = "disease_identification_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String, nullable=False)  # Service that produced the result
+    image_sha256 = Column(String(64), nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_disease_cache_provider_sha256", "provider", "image_sha256", unique=True),
+    )
@@ -0,0 +1,65 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Encode the id of the last row on a page as an opaque cursor.
+
+    Args:
+        last_id: Primary key of the last row returned
+
+    Returns:
+        A URL-safe token to pass back as the ``cursor`` query parameter
+    """
+    payload = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Optional[int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: The cursor sent by the client; an empty string requests the first page
+
+    Returns:
+        The id to continue after, or None for the first page
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def keyset_page(db, query, id_column, cursor: str, limit: int, newest_first: bool = True):
+    """
+    Run ``query`` as a keyset-paginated page, newest rows first.
+
+    Rows are ordered by ``id_column`` descending and filtered to ids below the
+    cursor, so each page is an index range scan of ``limit`` rows no matter how
+    deep it is, and rows inserted meanwhile do not shift later pages.
+    With ``newest_first=False`` pages run oldest first instead.
+
+    Returns:
+        Dict with ``items`` and ``next_cursor`` (None on the last page)
+    """
+    last_id = decode_cursor(cursor)
+    if last_id is not None:
+        query = query.where(id_column < last_id if newest_first else id_column > last_id)
+
+    # Fetch one extra row to know whether another page follows
+    order = id_column.desc() if newest_first else id_column.asc()
+    result = await db.execute(query.order_by(order).limit(limit + 1))
+    rows = result.scalars().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+
+    return {"items": rows, "next_cursor": next_cursor}
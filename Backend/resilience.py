@@ -0,0 +1,201 @@
+# resilience.py - Circuit breakers and a retry budget for upstream services
+# A degraded upstream should fail fast instead of holding connections until it
+# times out. Each upstream gets a breaker that opens once the failure rate over
+# its recent calls crosses a threshold; retries of failed calls draw from one
+# process-wide budget so they cannot multiply load on a struggling service.
+import os
+import random
+import time
+from collections import deque
+from typing import Dict
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+CIRCUIT_FAILURE_RATE_THRESHOLD = float(os.getenv("CIRCUIT_FAILURE_RATE_THRESHOLD", "0.5"))
+CIRCUIT_MINIMUM_CALLS = int(os.getenv("CIRCUIT_MINIMUM_CALLS", "10"))
+CIRCUIT_WINDOW_SIZE = int(os.getenv("CIRCUIT_WINDOW_SIZE", "20"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+RETRY_BUDGET_WINDOW_SECONDS = float(os.getenv("RETRY_BUDGET_WINDOW_SECONDS", "10"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one upstream.
+
+    Closed: calls pass and outcomes are kept for the last ``window_size`` calls.
+    Once at least ``minimum_calls`` are recorded and the failure rate reaches
+    ``failure_rate_threshold`` the breaker opens and rejects calls for
+    ``open_seconds``. It then half-opens and lets ``half_open_max_calls``
+    probes through: a success closes it again, a failure re-opens it.
+
+    Only used from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = CIRCUIT_FAILURE_RATE_THRESHOLD,
+        minimum_calls: int = CIRCUIT_MINIMUM_CALLS,
+        window_size: int = CIRCUIT_WINDOW_SIZE,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError."""
+        if self.state == OPEN:
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+            self._half_open_calls = 0
+
+        if self.state == HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self._half_open_calls += 1
+
+    def record(self, success: bool):
+        """Record the outcome of an admitted call."""
+        if self.state == HALF_OPEN:
+            if success:
+                self.state = CLOSED
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+
+        self._outcomes.append(success)
+        if len(self._outcomes) >= self.minimum_calls and self.failure_rate() >= self.failure_rate_threshold:
+            self._open()
+
+    def release(self):
+        """Give back an admitted call that ended without an outcome, e.g. because it was cancelled."""
+        if self.state == HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "recent_calls": len(self._outcomes),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """
+    Caps retries at ``ratio`` of the requests seen in the last ``window_seconds``,
+    plus ``min_per_second`` so low-traffic periods can still retry.
+    """
+
+    def __init__(
+        self,
+        ratio: float = RETRY_BUDGET_RATIO,
+        min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+        window_seconds: float = RETRY_BUDGET_WINDOW_SECONDS,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window_seconds = window_seconds
+        self._requests = deque()
+        self._retries = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        for events in (self._requests, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_request(self):
+        self._requests.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False when it is used up."""
+        now = time.monotonic()
+        self._trim(now)
+        allowed = self.min_per_second * self.window_seconds + self.ratio * len(self._requests)
+        if len(self._retries) >= allowed:
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        return {
+            "requests_in_window": len(self._requests),
+            "retries_in_window": len(self._retries),
+            "exhausted": self.exhausted,
+        }
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+retry_budget = RetryBudget()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def breaker_stats() -> dict:
+    """Breaker state per upstream for the metrics endpoint."""
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+
+metrics.register("circuit_breakers", breaker_stats)
+metrics.register("retry_budget", retry_budget.stats)
@@ -2,7 +2,7 @@ from datetime import timedelta
 
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import Depends, HTTPException, status, APIRouter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth.auth_handler import authenticate_user, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_user, get_password_hash
 from database import get_db
@@ -13,12 +13,12 @@ router = APIRouter()
 
 
 @router.post("/register/farmer", response_model=UserResponse)
-def register_farmer(user: FarmerCreate, db: Session = Depends(get_db)):
-    db_user = get_user(db, user.username)
+async def register_farmer(user: FarmerCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered.")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -31,18 +31,18 @@ def register_farmer(user: FarmerCreate, db: Session = Depends(get_db)):
         government_id=user.government_id
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/register/company", response_model=UserResponse)
-def register_company(user: CompanyCreate, db: Session = Depends(get_db)):
-    db_user = get_user(db, user.username)
+async def register_company(user: CompanyCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered.")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -57,17 +57,17 @@ def register_company(user: CompanyCreate, db: Session = Depends(get_db)):
         company_gst_id=user.company_gst_id
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/token")
 async def login_for_access_token(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ) -> Token:
-    user = authenticate_user(db, form_data.username, form_data.password)  
+    user = await authenticate_user(db, form_data.username, form_data.password)  
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,20 +1,154 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from sqlalchemy import func
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+import os
+from datetime import datetime
+from typing import List, Optional, Union
+from sqlalchemy import case, delete, exists, func, insert, or_, select, update
+from sqlalchemy.orm import selectinload
 
-from database import get_db
-from models import User, Farm, Bid, UserType, BidStatusEnum
-from schemas import BidCreate, BidResponse, BidUpdate, BidWithFarmResponse
-from auth.auth_handler import get_current_active_user
+from database import get_db, AsyncSessionLocal
+from models import User, Farm, Bid, BidEvent, BidEventType, UserType, BidStatusEnum, FarmStatusEnum
+from schemas import BidBulkCreate, BidBulkResponse, BidCreate, BidResponse, BidPage, BidEventPage, BidEventResponse, BidUpdate, BidWithFarmResponse, BidWithRelationsResponse, BidStatsResponse
+from auth.auth_handler import get_current_active_user, get_current_user, optional_oauth2_scheme
+from events import broker, user_topic
+from pagination import keyset_page
+from utils import parse_include
 
 router = APIRouter(prefix="/api", tags=["bids"])
 
+# Relations that bid listings can embed via `include=`
+BID_INCLUDES = {"farm"}
+
+def bid_load_options(include: set) -> list:
+    """Eager-load options for the requested relations, one extra query per relation"""
+    return [selectinload(Bid.farm)] if "farm" in include else []
+
+# Upper bound on farm ids accepted by the batched stats endpoint
+MAX_STATS_FARMS = 200
+# Upper bound on bids placed by one bulk request
+MAX_BULK_BIDS = 200
+
+async def compute_bid_stats(db: AsyncSession, farm_ids: List[int]) -> List[dict]:
+    """Aggregate bids per farm with a single grouped query, in the order requested"""
+    result = await db.execute(
+        select(
+            Bid.farm_id,
+            func.count(Bid.id).label("bid_count"),
+            func.sum(case((Bid.status == BidStatusEnum.PENDING, 1), else_=0)).label("pending_count"),
+            func.min(Bid.bid_amount).label("min_bid"),
+            func.max(Bid.bid_amount).label("max_bid"),
+            func.avg(Bid.bid_amount).label("avg_bid"),
+            func.max(Bid.bid_date).label("latest_bid_at"),
+        )
+        .where(Bid.farm_id.in_(farm_ids))
+        .group_by(Bid.farm_id)
+    )
+    stats = {row.farm_id: dict(row._mapping) for row in result}
+    # Farms without bids still get an entry with zero counts
+    return [stats.get(farm_id, {"farm_id": farm_id}) for farm_id in farm_ids]
+
+def bid_payload(bid: Bid, include: set) -> dict:
+    """Serialize a bid with the requested (already loaded) relations"""
+    data = BidResponse.model_validate(bid).model_dump()
+    if "farm" in include:
+        data["farm"] = bid.farm
+    return data
+
+# Seconds between keep-alive comments on idle event streams
+BID_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("BID_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+def record_bid_event(db: AsyncSession, bid: Bid, event_type: BidEventType, **previous):
+    """Append the bid's new state to its history; committed together with the change itself"""
+    db.add(BidEvent(
+        bid_id=bid.id,
+        farm_id=bid.farm_id,
+        company_username=bid.company_username,
+        event_type=event_type,
+        bid_amount=bid.bid_amount,
+        status=bid.status,
+        **previous
+    ))
+
+def publish_bid_event(event_type: str, bid: Bid, farmer_username: str, **details):
+    """Notify the farm owner and the bidding company of a committed bid change"""
+    event = {"type": event_type, "bid": BidResponse.model_validate(bid).model_dump(mode="json"), **details}
+    for username in {farmer_username, bid.company_username}:
+        broker.publish(user_topic(username), event)
+
+async def accept_bid_atomically(db: AsyncSession, bid_id: int, current_user: User) -> Bid:
+    """
+    Accept one pending bid, reject every other pending bid on its farm and mark
+    the farm sold, all in one transaction.
+
+    The farm row is locked with SELECT ... FOR UPDATE where the database
+    supports it; the farm is then claimed with a conditional UPDATE, so on
+    SQLite (no row locks) concurrent accepts still see exactly one winner.
+    """
+    db_bid = await db.get(Bid, bid_id)
+    if not db_bid:
+        raise HTTPException(status_code=404, detail="Bid not found")
+    
+    farm = await db.get(Farm, db_bid.farm_id, with_for_update=True)
+    if current_user.user_type != UserType.FARMER or current_user.username != farm.farmer_username:
+        raise HTTPException(status_code=403, detail="Only the farm owner can accept a bid")
+    
+    if db_bid.status != BidStatusEnum.PENDING:
+        raise HTTPException(status_code=400, detail="Only pending bids can be accepted")
+    
+    # Claim the farm: only succeeds if it is not sold and has no accepted bid yet
+    claimed = await db.execute(
+        update(Farm)
+        .where(
+            Farm.id == farm.id,
+            or_(Farm.farm_status.is_(None), Farm.farm_status != FarmStatusEnum.SOLD),
+            ~exists().where(Bid.farm_id == farm.id, Bid.status == BidStatusEnum.ACCEPTED)
+        )
+        .values(farm_status=FarmStatusEnum.SOLD)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="A bid has already been accepted for this farm")
+    
+    # The bid may have been withdrawn since it was read
+    accepted = await db.execute(
+        update(Bid)
+        .where(Bid.id == bid_id, Bid.status == BidStatusEnum.PENDING)
+        .values(status=BidStatusEnum.ACCEPTED)
+    )
+    if accepted.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="The bid is no longer pending")
+    # The amount may have changed since the bid was read; the row is now locked
+    await db.refresh(db_bid)
+    
+    # Reject the competing bids in one statement
+    rejected = await db.scalars(
+        update(Bid)
+        .where(Bid.farm_id == farm.id, Bid.id != bid_id, Bid.status == BidStatusEnum.PENDING)
+        .values(status=BidStatusEnum.REJECTED)
+        .returning(Bid)
+        .execution_options(synchronize_session=False)
+    )
+    rejected_bids = rejected.all()
+    
+    for bid in [db_bid, *rejected_bids]:
+        record_bid_event(db, bid, BidEventType.STATUS_CHANGED, previous_status=BidStatusEnum.PENDING)
+    await db.commit()
+    await db.refresh(db_bid)
+    
+    publish_bid_event("bid_status_changed", db_bid, farm.farmer_username, previous_status=BidStatusEnum.PENDING.value)
+    for bid in rejected_bids:
+        publish_bid_event("bid_status_changed", bid, farm.farmer_username, previous_status=BidStatusEnum.PENDING.value)
+    return db_bid
+
 # Create a new bid (only for companies)
 @router.post("/bids/", response_model=BidResponse)
 async def create_bid(
     bid: BidCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if user is a company
@@ -22,16 +156,19 @@ async def create_bid(
         raise HTTPException(status_code=403, detail="Only companies can place bids")
     
     # Check if farm exists
-    farm = db.query(Farm).filter(Farm.id == bid.farm_id).first()
+    farm = await db.get(Farm, bid.farm_id)
     if not farm:
         raise HTTPException(status_code=404, detail="Farm not found")
+    if farm.farm_status == FarmStatusEnum.SOLD:
+        raise HTTPException(status_code=400, detail="This farm has already been sold")
     
     # Check if company already has a pending bid for this farm
-    existing_bid = db.query(Bid).filter(
+    result = await db.execute(select(Bid).where(
         Bid.farm_id == bid.farm_id,
         Bid.company_username == current_user.username,
         Bid.status == BidStatusEnum.PENDING
-    ).first()
+    ))
+    existing_bid = result.scalars().first()
     
     if existing_bid:
         raise HTTPException(status_code=400, detail="You already have a pending bid for this farm")
@@ -45,59 +182,241 @@ async def create_bid(
     )
     
     db.add(db_bid)
-    db.commit()
-    db.refresh(db_bid)
+    await db.flush()
+    record_bid_event(db, db_bid, BidEventType.CREATED)
+    await db.commit()
+    await db.refresh(db_bid)
     
+    publish_bid_event("bid_created", db_bid, farm.farmer_username)
     return db_bid
 
+# Place bids on many farms at once (only for companies)
+# Farms and existing pending bids are checked with one query each and all new bids
+# are inserted in one transaction; each item reports its own success or error.
+@router.post("/bids/bulk", response_model=BidBulkResponse)
+async def create_bids_bulk(
+    request: BidBulkCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    if current_user.user_type != UserType.COMPANY:
+        raise HTTPException(status_code=403, detail="Only companies can place bids")
+    if not request.bids:
+        raise HTTPException(status_code=400, detail="At least one bid is required")
+    if len(request.bids) > MAX_BULK_BIDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_BIDS} bids can be placed at once")
+    
+    farm_ids = {item.farm_id for item in request.bids}
+    result = await db.execute(
+        select(Farm.id, Farm.farmer_username, Farm.farm_status).where(Farm.id.in_(farm_ids))
+    )
+    farms = {row.id: row for row in result}
+    result = await db.execute(select(Bid.farm_id).where(
+        Bid.farm_id.in_(farm_ids),
+        Bid.company_username == current_user.username,
+        Bid.status == BidStatusEnum.PENDING
+    ))
+    pending = set(result.scalars())
+    
+    results, accepted = [], []
+    for index, item in enumerate(request.bids):
+        farm = farms.get(item.farm_id)
+        if farm is None:
+            error = "Farm not found"
+        elif farm.farm_status == FarmStatusEnum.SOLD:
+            error = "This farm has already been sold"
+        elif item.farm_id in pending:
+            error = "You already have a pending bid for this farm"
+        else:
+            error = None
+            # Later items for the same farm count as duplicates of this one
+            pending.add(item.farm_id)
+            accepted.append(index)
+        results.append({"index": index, "farm_id": item.farm_id, "success": error is None, "error": error})
+    
+    created = []
+    if accepted:
+        result = await db.scalars(
+            insert(Bid).returning(Bid, sort_by_parameter_order=True),
+            [
+                {
+                    "farm_id": request.bids[index].farm_id,
+                    "company_username": current_user.username,
+                    "bid_amount": request.bids[index].bid_amount,
+                    "status": BidStatusEnum.PENDING
+                }
+                for index in accepted
+            ]
+        )
+        created = result.all()
+        for db_bid in created:
+            record_bid_event(db, db_bid, BidEventType.CREATED)
+        await db.commit()
+    
+    # sort_by_parameter_order keeps RETURNING rows in the order they were sent
+    for index, db_bid in zip(accepted, created):
+        results[index]["bid"] = db_bid
+        publish_bid_event("bid_created", db_bid, farms[db_bid.farm_id].farmer_username)
+    
+    return {"created": len(created), "failed": len(results) - len(created), "results": results}
+
 # Get all bids with optional farm_id filter
-@router.get("/bids/", response_model=List[BidResponse])
+# Passing `cursor` (empty for the first page) switches to keyset pagination,
+# newest first, and returns {"items": [...], "next_cursor": ...}
+# `include=farm` embeds each bid's farm
+@router.get("/bids/", response_model=Union[BidPage, List[BidWithRelationsResponse]], response_model_exclude_unset=True)
 async def get_bids(
     farm_id: Optional[int] = None,
     status: Optional[BidStatusEnum] = None,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    query = db.query(Bid)
+    relations = parse_include(include, BID_INCLUDES)
+    query = select(Bid).options(*bid_load_options(relations))
     
     # Companies can only see their own bids
     if current_user.user_type == UserType.COMPANY:
-        query = query.filter(Bid.company_username == current_user.username)
+        query = query.where(Bid.company_username == current_user.username)
     
     # Farmers can only see bids for their farms
     elif current_user.user_type == UserType.FARMER:
         # Get all farms owned by the farmer
-        farmer_farms = db.query(Farm.id).filter(Farm.farmer_username == current_user.username).all()
-        farmer_farm_ids = [farm[0] for farm in farmer_farms]
-        query = query.filter(Bid.farm_id.in_(farmer_farm_ids))
+        farmer_farms = await db.execute(select(Farm.id).where(Farm.farmer_username == current_user.username))
+        farmer_farm_ids = farmer_farms.scalars().all()
+        query = query.where(Bid.farm_id.in_(farmer_farm_ids))
     
     # Apply additional filters if provided
     if farm_id:
-        query = query.filter(Bid.farm_id == farm_id)
+        query = query.where(Bid.farm_id == farm_id)
     
     if status:
-        query = query.filter(Bid.status == status)
+        query = query.where(Bid.status == status)
+    
+    if cursor is not None:
+        page = await keyset_page(db, query, Bid.id, cursor, limit)
+        page["items"] = [bid_payload(bid, relations) for bid in page["items"]]
+        return page
     
     # Execute query with pagination
-    bids = query.offset(skip).limit(limit).all()
-    return bids
+    result = await db.execute(query.offset(skip).limit(limit))
+    return [bid_payload(bid, relations) for bid in result.scalars().all()]
+
+# Server-sent event stream of bid changes visible to the caller: bids on their farms
+# (farmers) or bids they placed (companies). Events are bid_created, bid_amount_changed,
+# bid_status_changed and bid_withdrawn; resync means events were dropped and bids should
+# be refetched.
+# EventSource cannot set headers, so the access token may also be passed as `?token=`.
+@router.get("/bids/events")
+async def stream_bid_events(
+    token: Optional[str] = None,
+    header_token: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    if not (token or header_token):
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    # Short-lived session so the stream does not hold a database connection
+    async with AsyncSessionLocal() as db:
+        current_user = await get_current_user(token or header_token, db)
+    
+    subscription = broker.subscribe(user_topic(current_user.username))
+    
+    async def event_stream():
+        async with subscription:
+            yield "retry: 3000\n\n"
+            while True:
+                event = await subscription.get(timeout=BID_EVENTS_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Bid statistics for several farms at once, e.g. /bids/stats?farm_ids=1,2,3
+@router.get("/bids/stats", response_model=List[BidStatsResponse])
+async def get_bid_stats(
+    farm_ids: str = Query(..., description="Comma-separated farm ids"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    try:
+        ids = list(dict.fromkeys(int(value) for value in farm_ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="farm_ids must be a comma-separated list of integers")
+    
+    if not ids:
+        raise HTTPException(status_code=400, detail="At least one farm id is required")
+    if len(ids) > MAX_STATS_FARMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATS_FARMS} farm ids can be requested at once")
+    
+    return await compute_bid_stats(db, ids)
+
+# Bid statistics for a single farm
+@router.get("/farms/{farm_id}/bid-stats", response_model=BidStatsResponse)
+async def get_farm_bid_stats(
+    farm_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    farm = await db.get(Farm, farm_id)
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    
+    stats = await compute_bid_stats(db, [farm_id])
+    return stats[0]
+
+# Price timeline of a farm from the append-only bid history, oldest first and
+# paginated by cursor (empty for the first page). Other companies' names are hidden
+# unless the caller owns the farm.
+@router.get("/farms/{farm_id}/bid-history", response_model=BidEventPage)
+async def get_farm_bid_history(
+    farm_id: int,
+    cursor: str = "",
+    limit: int = Query(100, ge=1, le=1000),
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    farm = await db.get(Farm, farm_id)
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    
+    query = select(BidEvent).where(BidEvent.farm_id == farm_id)
+    if since is not None:
+        query = query.where(BidEvent.created_at >= since)
+    
+    page = await keyset_page(db, query, BidEvent.id, cursor, limit, newest_first=False)
+    is_owner = current_user.username == farm.farmer_username
+    items = []
+    for event in page["items"]:
+        item = BidEventResponse.model_validate(event)
+        if not is_owner and event.company_username != current_user.username:
+            item.company_username = None
+        items.append(item)
+    page["items"] = items
+    return page
 
 # Get a specific bid
 @router.get("/bids/{bid_id}", response_model=BidWithFarmResponse)
 async def get_bid(
     bid_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    # Get bid
-    bid = db.query(Bid).filter(Bid.id == bid_id).first()
+    # Get bid together with its farm
+    bid = await db.get(Bid, bid_id, options=[selectinload(Bid.farm)])
     if not bid:
         raise HTTPException(status_code=404, detail="Bid not found")
     
     # Check permissions
-    farm = db.query(Farm).filter(Farm.id == bid.farm_id).first()
+    farm = bid.farm
     
     # Only the bid maker (company) or farm owner (farmer) can see a specific bid
     if (current_user.user_type == UserType.COMPANY and current_user.username == bid.company_username) or \
@@ -111,16 +430,21 @@ async def get_bid(
 async def update_bid(
     bid_id: int,
     bid_update: BidUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
+    # Accepting goes through the atomic path so the farm is sold exactly once
+    if bid_update.status == BidStatusEnum.ACCEPTED and bid_update.bid_amount is None:
+        return await accept_bid_atomically(db, bid_id, current_user)
+    
     # Get bid
-    db_bid = db.query(Bid).filter(Bid.id == bid_id).first()
+    db_bid = await db.get(Bid, bid_id)
     if not db_bid:
         raise HTTPException(status_code=404, detail="Bid not found")
     
     # Get farm
-    farm = db.query(Farm).filter(Farm.id == db_bid.farm_id).first()
+    farm = await db.get(Farm, db_bid.farm_id)
+    previous_amount, previous_status = db_bid.bid_amount, db_bid.status
     
     # Check permissions based on update type
     if bid_update.bid_amount is not None:
@@ -132,30 +456,66 @@ async def update_bid(
         if db_bid.status != BidStatusEnum.PENDING:
             raise HTTPException(status_code=400, detail="Cannot update the amount of a non-pending bid")
         
-        # Update bid amount
-        db_bid.bid_amount = bid_update.bid_amount
-    
     if bid_update.status is not None:
         # Only the farm owner (farmer) can update the bid status
         if current_user.user_type != UserType.FARMER or current_user.username != farm.farmer_username:
             raise HTTPException(status_code=403, detail="Only the farm owner can update the bid status")
         
-        # Update bid status
-        db_bid.status = bid_update.status
+        # An accepted bid closed the sale; it cannot be reopened or rejected afterwards
+        if db_bid.status == BidStatusEnum.ACCEPTED:
+            raise HTTPException(status_code=400, detail="Cannot change the status of an accepted bid")
+        
+    changes = {}
+    if bid_update.bid_amount is not None and bid_update.bid_amount != previous_amount:
+        changes["bid_amount"] = bid_update.bid_amount
+    if bid_update.status is not None and bid_update.status != previous_status:
+        changes["status"] = bid_update.status
+    if not changes:
+        return db_bid
+    
+    # Apply the edit only if the bid is still in the state checked above, so it
+    # cannot overwrite a concurrent accept or rejection
+    conditions = [Bid.id == bid_id, Bid.status == previous_status]
+    if changes.get("status") == BidStatusEnum.PENDING:
+        # A bid cannot be reopened on a farm that has been sold meanwhile
+        conditions.append(~exists().where(Farm.id == db_bid.farm_id, Farm.farm_status == FarmStatusEnum.SOLD))
+    result = await db.execute(update(Bid).where(*conditions).values(**changes))
+    if result.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="The bid was changed by another request; reload it and try again")
+    await db.refresh(db_bid)
+    
+    if "bid_amount" in changes:
+        record_bid_event(db, db_bid, BidEventType.AMOUNT_CHANGED, previous_amount=previous_amount)
+    if "status" in changes:
+        record_bid_event(db, db_bid, BidEventType.STATUS_CHANGED, previous_status=previous_status)
+    await db.commit()
+    await db.refresh(db_bid)
     
-    db.commit()
-    db.refresh(db_bid)
+    if db_bid.bid_amount != previous_amount:
+        publish_bid_event("bid_amount_changed", db_bid, farm.farmer_username, previous_amount=previous_amount)
+    if db_bid.status != previous_status:
+        publish_bid_event("bid_status_changed", db_bid, farm.farmer_username, previous_status=previous_status.value)
     return db_bid
 
+# Accept a bid (only for the farm owner): rejects the other pending bids and marks the farm sold
+@router.post("/bids/{bid_id}/accept", response_model=BidResponse)
+async def accept_bid(
+    bid_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    return await accept_bid_atomically(db, bid_id, current_user)
+
 # Delete a bid (only for the bid maker and only if pending)
 @router.delete("/bids/{bid_id}", status_code=204)
 async def delete_bid(
     bid_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get bid
-    db_bid = db.query(Bid).filter(Bid.id == bid_id).first()
+    db_bid = await db.get(Bid, bid_id)
     if not db_bid:
         raise HTTPException(status_code=404, detail="Bid not found")
     
@@ -167,25 +527,39 @@ async def delete_bid(
     if db_bid.status != BidStatusEnum.PENDING:
         raise HTTPException(status_code=400, detail="Cannot delete a non-pending bid")
     
-    # Delete bid
-    db.delete(db_bid)
-    db.commit()
+    # Delete bid, keeping its history; only if it is still pending, as a
+    # concurrent accept may have closed it since it was read
+    farm = await db.get(Farm, db_bid.farm_id)
+    result = await db.execute(delete(Bid).where(Bid.id == bid_id, Bid.status == BidStatusEnum.PENDING))
+    if result.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="The bid is no longer pending")
+    record_bid_event(db, db_bid, BidEventType.WITHDRAWN)
+    await db.commit()
+    
+    publish_bid_event("bid_withdrawn", db_bid, farm.farmer_username)
     return None
 
 # Get all bids made by the current company
-@router.get("/bids/my-bids/", response_model=List[BidResponse])
+@router.get("/bids/my-bids/", response_model=List[BidWithRelationsResponse], response_model_exclude_unset=True)
 async def get_my_bids(
     status: Optional[BidStatusEnum] = None,
-    db: Session = Depends(get_db),
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     if current_user.user_type != UserType.COMPANY:
         raise HTTPException(status_code=403, detail="Only companies can access this endpoint")
     
-    query = db.query(Bid).filter(Bid.company_username == current_user.username)
+    relations = parse_include(include, BID_INCLUDES)
+    query = (
+        select(Bid)
+        .where(Bid.company_username == current_user.username)
+        .options(*bid_load_options(relations))
+    )
     
     if status:
-        query = query.filter(Bid.status == status)
+        query = query.where(Bid.status == status)
     
-    bids = query.all()
-    return bids 
\ No newline at end of file
+    result = await db.execute(query)
+    return [bid_payload(bid, relations) for bid in result.scalars().all()] 
\ No newline at end of file
@@ -1,25 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import logging
+import mimetypes
 import os
-import shutil
-import requests
-from typing import Optional
-from dotenv import load_dotenv
+from typing import List, Optional
 from datetime import datetime
-import uuid
 
-from database import get_db
+from database import get_db, AsyncSessionLocal
 from auth.auth_handler import get_current_active_user
-from models import User, CropHealthRecord
-
-# Load environment configuration for API integration
-# Implements secure credential management pattern
-load_dotenv()
-
-# Retrieve API configuration with fallback mechanism
-CROP_DISEASE_API_KEY = os.getenv("CROP_DISEASE_API_KEY")
-CROP_DISEASE_API_URL = os.getenv("CROP_DISEASE_API_URL")
+from models import User, CropHealthRecord, CropHealthJobStatus
+from schemas import CropHealthJobResponse
+from disease_api import DiseaseAPIError, ServiceDegraded
+import detectors
+from workers import JobQueue, ExecutorSaturated
+from utils import store_upload
 
 router = APIRouter(
     prefix="/api",
@@ -27,11 +24,45 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+logger = logging.getLogger("uvicorn.error")
+
+MAX_BATCH_IMAGES = int(os.getenv("CROP_HEALTH_MAX_BATCH_IMAGES", "20"))
+
+async def save_crop_image(image: UploadFile, keep_content: bool = True):
+    """Validate and store an uploaded image; returns (file_path, unique_filename, content)."""
+    # Validate image format from its magic bytes and stream it to disk in chunks
+    try:
+        stored = await store_upload(image, keep_content=keep_content)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
+    finally:
+        image.file.close()
+    return stored.path.as_posix(), stored.path.name, stored.content
+
+def content_type_for(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+async def analyze_image(db: AsyncSession, filename: str, content: bytes, content_type: str) -> dict:
+    """
+    Run disease detection for one image with the detector selected by DISEASE_DETECTOR.
+
+    Raises DiseaseAPIError when detection fails, ServiceDegraded when the remote service is unavailable.
+    """
+    return await detectors.detector.identify(db, filename, content, content_type)
+
+def apply_result(record: CropHealthRecord, result: dict):
+    record.detected_disease = result.get("name", "Unknown")
+    record.confidence_score = result.get("probability", 0.0)
+    record.scientific_name = result.get("scientific_name", "")
+    record.result = result
+    record.status = CropHealthJobStatus.COMPLETED
+    record.completed_at = datetime.utcnow()
+
 @router.post("/crop-disease-identify")
 async def identify_crop_disease(
     image: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Identifies crop diseases from uploaded plant images using computer vision.
@@ -44,108 +75,152 @@ async def identify_crop_disease(
     
     Returns a comprehensive analysis with confidence scoring and treatment options.
     """
-    # Validate image format to prevent security vulnerabilities
-    if not image.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    # Implement structured file storage for ML processing
-    upload_dir = "media/crop_images"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate cryptographically secure filename to prevent collisions
-    file_extension = os.path.splitext(image.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(upload_dir, unique_filename)
+    file_path, unique_filename, content = await save_crop_image(image)
     
-    # Persist uploaded image with proper error handling
+    # Detection runs on the configured backend: local model, external ML API through
+    # the shared pooled client, or a mock result when neither is available
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
-    finally:
-        image.file.close()
-    
-    # Graceful degradation to mock response when API keys unavailable
-    # Enables development workflow without external dependencies
-    if not CROP_DISEASE_API_KEY or not CROP_DISEASE_API_URL:
-        # Generate structured mock response with realistic disease data
-        mock_result = {
-            "name": "Late Blight",
-            "scientific_name": "Phytophthora infestans",
-            "probability": 0.89,
-            "treatment": {
-                "prevention": [
-                    "Plant resistant varieties when available",
-                    "Ensure proper spacing between plants for good air circulation",
-                    "Avoid overhead irrigation and water early in the day",
-                    "Rotate crops (3-4 year rotation)",
-                    "Remove and destroy all infected plant debris"
-                ],
-                "chemical": [
-                    "Chlorothalonil-based fungicides (preventative)",
-                    "Mancozeb-based products (preventative)",
-                    "Metalaxyl or mefenoxam combined with a protectant fungicide",
-                    "Copper-based fungicides for organic production"
-                ],
-                "biological": [
-                    "Bacillus subtilis-based products",
-                    "Trichoderma harzianum-based products",
-                    "Compost tea applications to boost plant immunity"
-                ]
-            }
-        }
+        result = await analyze_image(db, unique_filename, content, content_type_for(unique_filename))
         
-        # Persist detection results for longitudinal data analysis
+        # Persist detection results for longitudinal research
         crop_health_record = CropHealthRecord(
             user_id=current_user.id,
             image_path=f"/{file_path}",
-            detected_disease=mock_result["name"],
-            confidence_score=mock_result["probability"],
-            scientific_name=mock_result["scientific_name"],
             timestamp=datetime.utcnow()
         )
+        apply_result(crop_health_record, result)
         db.add(crop_health_record)
-        db.commit()
+        await db.commit()
         
-        return mock_result
-    
-    # Production pathway: integrate with external ML API
-    try:
-        with open(file_path, "rb") as img_file:
-            files = {"image": (unique_filename, img_file, image.content_type)}
-            headers = {"Authorization": f"Bearer {CROP_DISEASE_API_KEY}"}
-            
-            # Make authenticated request to disease detection service
-            response = requests.post(
-                CROP_DISEASE_API_URL,
-                files=files,
-                headers=headers
-            )
-            
-            # Handle API errors with appropriate status codes
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error from crop disease API: {response.text}"
+        return result
+    except ServiceDegraded as e:
+        raise HTTPException(status_code=503, detail=e.message, headers={"Retry-After": str(e.retry_after)})
+    except DiseaseAPIError as e:
+        raise HTTPException(status_code=500, detail=e.message)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+async def process_analysis_job(record_id: int):
+    """Analyze the stored image of a pending CropHealthRecord and save the outcome."""
+    async with AsyncSessionLocal() as db:
+        record = await db.get(CropHealthRecord, record_id)
+        if record is None or record.status not in (CropHealthJobStatus.PENDING, CropHealthJobStatus.PROCESSING):
+            return
+        record.status = CropHealthJobStatus.PROCESSING
+        await db.commit()
+
+        file_path = record.image_path.lstrip("/")
+        filename = os.path.basename(file_path)
+        try:
+            content = await asyncio.to_thread(_read_file, file_path)
+            result = await analyze_image(db, filename, content, content_type_for(filename))
+            apply_result(record, result)
+            await db.commit()
+        except Exception as e:
+            # Any failure ends the job; left PROCESSING it would be re-queued on every restart
+            if not isinstance(e, (DiseaseAPIError, OSError)):
+                logger.exception("Crop analysis job %s failed", record_id)
+            await db.rollback()
+            await db.execute(
+                update(CropHealthRecord)
+                .where(CropHealthRecord.id == record_id)
+                .values(
+                    status=CropHealthJobStatus.FAILED,
+                    error=getattr(e, "message", None) or str(e) or type(e).__name__,
+                    completed_at=datetime.utcnow()
                 )
-            
-            result = response.json()
-            
-            # Persist detection results for longitudinal research
-            crop_health_record = CropHealthRecord(
-                user_id=current_user.id,
-                image_path=f"/{file_path}",
-                detected_disease=result.get("name", "Unknown"),
-                confidence_score=result.get("probability", 0.0),
-                scientific_name=result.get("scientific_name", ""),
-                timestamp=datetime.utcnow()
             )
-            db.add(crop_health_record)
-            db.commit()
-            
-            return result
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Error calling crop disease API: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}") 
\ No newline at end of file
+            await db.commit()
+
+def _read_file(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
+
+analysis_queue = JobQueue(
+    "crop_analysis_jobs",
+    handler=process_analysis_job,
+    workers=int(os.getenv("CROP_HEALTH_JOB_WORKERS", "4")),
+    max_queued=int(os.getenv("CROP_HEALTH_JOB_QUEUE_SIZE", "100")),
+)
+
+async def start_analysis_jobs():
+    """Start the job workers and re-queue analyses interrupted by a restart."""
+    await analysis_queue.start()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(CropHealthRecord.id)
+            .where(CropHealthRecord.status.in_([CropHealthJobStatus.PENDING, CropHealthJobStatus.PROCESSING]))
+            .order_by(CropHealthRecord.id)
+            .limit(analysis_queue.free_slots())
+        )
+        for record_id in result.scalars().all():
+            analysis_queue.submit(record_id)
+
+def queue_unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many analyses are queued, please retry shortly",
+        headers={"Retry-After": "5"},
+    )
+
+async def submit_analysis_jobs(images: List[UploadFile], current_user: User, db: AsyncSession) -> List[CropHealthRecord]:
+    """Store each image, record a pending analysis for it and queue the analyses."""
+    if analysis_queue.free_slots() < len(images):
+        raise queue_unavailable()
+
+    records = []
+    for image in images:
+        file_path, _, _ = await save_crop_image(image, keep_content=False)
+        record = CropHealthRecord(
+            user_id=current_user.id,
+            image_path=f"/{file_path}",
+            status=CropHealthJobStatus.PENDING,
+            timestamp=datetime.utcnow()
+        )
+        db.add(record)
+        records.append(record)
+    await db.commit()
+
+    for record in records:
+        try:
+            analysis_queue.submit(record.id)
+        except ExecutorSaturated:
+            # Lost a race for the last slots; fail the job instead of leaving it pending
+            record.status = CropHealthJobStatus.FAILED
+            record.error = "Analysis queue is full, please resubmit the image"
+            record.completed_at = datetime.utcnow()
+    await db.commit()
+    return records
+
+# Submit one image for background analysis; poll the returned job for the result
+@router.post("/crop-health/jobs", response_model=CropHealthJobResponse, status_code=202)
+async def submit_crop_disease_job(
+    image: UploadFile = File(...),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    records = await submit_analysis_jobs([image], current_user, db)
+    return records[0]
+
+# Submit several images in one request; each becomes its own job
+@router.post("/crop-health/jobs/batch", response_model=List[CropHealthJobResponse], status_code=202)
+async def submit_crop_disease_jobs(
+    images: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if len(images) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} images per batch")
+    return await submit_analysis_jobs(images, current_user, db)
+
+# Status and result of a submitted analysis
+@router.get("/crop-health/jobs/{job_id}", response_model=CropHealthJobResponse)
+async def get_crop_disease_job(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    record = await db.get(CropHealthRecord, job_id)
+    if record is None or record.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return record
@@ -1,29 +1,62 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from sqlalchemy import or_
-import requests
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.orm import selectinload
 from fastapi.responses import JSONResponse
-import os
-from dotenv import load_dotenv
 
 from database import get_db
-from models import User, Farm, FarmImage, UserType, FarmStatusEnum
-from schemas import FarmCreate, FarmResponse, FarmUpdate, FarmWithBidsResponse, FarmImageResponse, FarmWithImagesResponse, DiseaseIdentificationResponse
+from models import User, Farm, FarmImage, Bid, UserType, FarmStatusEnum
+from schemas import FarmCreate, FarmResponse, FarmPage, FarmDistanceResponse, FarmUpdate, FarmWithBidsResponse, FarmImageResponse, FarmWithImagesResponse, FarmWithRelationsResponse, BidResponse, DiseaseIdentificationResponse
 from auth.auth_handler import get_current_active_user
-from utils import save_upload_file, delete_file
-
-# Load environment variables
-load_dotenv()
-KINDWISE_API_KEY = os.getenv("KINDWISE_API_KEY", "")
+from utils import store_upload, media_url, parse_include
+from media_store import schedule_release, discard_uploads
+from image_variants import schedule_variants
+from pagination import keyset_page
+from geo import bounding_box, covering_prefixes, haversine_km
+from search import index_farm, unindex_farm, search_farms
+from disease_api import kindwise_identify, DiseaseAPIError, ServiceDegraded
+from disease_cache import identify_with_cache
 
 router = APIRouter(prefix="/api", tags=["farms"])
 
+# Relations that farm listings can embed via `include=`
+FARM_INCLUDES = {"images", "bids", "farmer"}
+
+def farm_load_options(include: set, current_user: User) -> list:
+    """Eager-load options for the requested relations, one extra query per relation"""
+    options = []
+    if "images" in include:
+        options.append(selectinload(Farm.images))
+    if "bids" in include:
+        if current_user.user_type == UserType.COMPANY:
+            # Companies only ever see their own bids
+            options.append(selectinload(Farm.bids.and_(Bid.company_username == current_user.username)))
+        else:
+            options.append(selectinload(Farm.bids))
+    if "farmer" in include:
+        options.append(selectinload(Farm.farmer))
+    return options
+
+def farm_payload(farm: Farm, include: set, current_user: User) -> dict:
+    """Serialize a farm with the requested (already loaded) relations"""
+    data = FarmResponse.model_validate(farm).model_dump()
+    if "images" in include:
+        data["images"] = farm.images
+    if "bids" in include:
+        # Farmers only see bids on their own farms
+        visible = current_user.user_type == UserType.COMPANY or farm.farmer_username == current_user.username
+        data["bids"] = [BidResponse.model_validate(bid) for bid in farm.bids] if visible else []
+    if "farmer" in include:
+        data["farmer"] = farm.farmer
+    return data
+
 # Create a new farm (only for farmers)
 @router.post("/farms/", response_model=FarmResponse)
 async def create_farm(
     farm: FarmCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if user is a farmer
@@ -37,8 +70,10 @@ async def create_farm(
     )
     
     db.add(db_farm)
-    db.commit()
-    db.refresh(db_farm)
+    await db.flush()
+    await index_farm(db, db_farm)
+    await db.commit()
+    await db.refresh(db_farm)
     return db_farm
 
 # Upload images for a farm
@@ -46,11 +81,11 @@ async def create_farm(
 async def upload_farm_images(
     farm_id: int,
     images: List[UploadFile] = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if farm exists
-    db_farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    db_farm = await db.get(Farm, farm_id)
     if not db_farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -58,26 +93,30 @@ async def upload_farm_images(
     if current_user.username != db_farm.farmer_username:
         raise HTTPException(status_code=403, detail="You don't have permission to upload images for this farm")
     
-    # Save images and create records
-    saved_images = []
-    for image in images:
-        # Check if file is an image
-        if not image.content_type.startswith("image/"):
-            continue
-        
-        # Save image and get path
-        image_path = await save_upload_file(image)
-        
-        # Create image record
-        db_image = FarmImage(
-            farm_id=farm_id,
-            image_url=image_path
+    # Write all images concurrently; the format is checked from each file's magic bytes
+    results = await asyncio.gather(*(store_upload(image) for image in images), return_exceptions=True)
+    stored = [result for result in results if not isinstance(result, BaseException)]
+    failure = next((result for result in results if isinstance(result, BaseException)), None)
+    if failure is not None:
+        discard_uploads(stored)
+        raise failure
+    
+    # Create every record with one INSERT in a single transaction
+    try:
+        result = await db.scalars(
+            insert(FarmImage).returning(FarmImage),
+            [{"farm_id": farm_id, "image_url": media_url(file.path)} for file in stored]
         )
-        
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
-        saved_images.append(db_image)
+        saved_images = result.all()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        discard_uploads(stored)
+        raise
+    
+    # Pre-render thumbnails and responsive variants off the request path
+    for db_image in saved_images:
+        schedule_variants(db_image.image_url)
     
     return saved_images
 
@@ -85,32 +124,32 @@ async def upload_farm_images(
 @router.get("/farms/{farm_id}/images/", response_model=List[FarmImageResponse])
 async def get_farm_images(
     farm_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if farm exists
-    db_farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    db_farm = await db.get(Farm, farm_id)
     if not db_farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
     # Get all images for the farm
-    images = db.query(FarmImage).filter(FarmImage.farm_id == farm_id).all()
-    return images
+    result = await db.execute(select(FarmImage).where(FarmImage.farm_id == farm_id))
+    return result.scalars().all()
 
 # Delete a farm image
 @router.delete("/farms/images/{image_id}", status_code=204)
 async def delete_farm_image(
     image_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get the image
-    db_image = db.query(FarmImage).filter(FarmImage.id == image_id).first()
+    db_image = await db.get(FarmImage, image_id)
     if not db_image:
         raise HTTPException(status_code=404, detail="Image not found")
     
     # Get the farm to check ownership
-    db_farm = db.query(Farm).filter(Farm.id == db_image.farm_id).first()
+    db_farm = await db.get(Farm, db_image.farm_id)
     if not db_farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -118,52 +157,116 @@ async def delete_farm_image(
     if current_user.username != db_farm.farmer_username:
         raise HTTPException(status_code=403, detail="You don't have permission to delete this image")
     
-    # Delete the file
-    delete_file(db_image.image_url)
-    
-    # Delete the record
-    db.delete(db_image)
-    db.commit()
+    # Delete the record, then the file unless another record shares it
+    image_url = db_image.image_url
+    await db.delete(db_image)
+    await db.commit()
+    schedule_release([image_url])
     
     return None
 
 # Get all farms with optional filters
-@router.get("/farms/", response_model=List[FarmResponse])
+# Passing `cursor` (empty for the first page) switches to keyset pagination,
+# newest first, and returns {"items": [...], "next_cursor": ...}
+# `include` embeds related rows: any of images, bids, farmer (comma-separated)
+@router.get("/farms/", response_model=Union[FarmPage, List[FarmWithRelationsResponse]], response_model_exclude_unset=True)
 async def get_farms(
     crop_type: Optional[str] = None,
     is_organic: Optional[bool] = None,
     farm_location: Optional[str] = None,
     farm_status: Optional[FarmStatusEnum] = None,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    query = db.query(Farm)
+    relations = parse_include(include, FARM_INCLUDES)
+    query = select(Farm).options(*farm_load_options(relations, current_user))
     
     # Apply filters if provided
     if crop_type:
-        query = query.filter(Farm.crop_type == crop_type)
+        query = query.where(Farm.crop_type == crop_type)
     if is_organic is not None:
-        query = query.filter(Farm.is_organic == is_organic)
+        query = query.where(Farm.is_organic == is_organic)
     if farm_location:
-        query = query.filter(Farm.farm_location.contains(farm_location))
+        query = query.where(Farm.farm_location.contains(farm_location))
     if farm_status:
-        query = query.filter(Farm.farm_status == farm_status)
+        query = query.where(Farm.farm_status == farm_status)
+    
+    if cursor is not None:
+        page = await keyset_page(db, query, Farm.id, cursor, limit)
+        page["items"] = [farm_payload(farm, relations, current_user) for farm in page["items"]]
+        return page
     
     # Execute query with pagination
-    farms = query.offset(skip).limit(limit).all()
-    return farms
+    result = await db.execute(query.offset(skip).limit(limit))
+    return [farm_payload(farm, relations, current_user) for farm in result.scalars().all()]
+
+# Full-text search over farm location, crop type and pesticide notes, best match first
+@router.get("/farms/search", response_model=List[FarmResponse])
+async def search_farm_listings(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    return await search_farms(db, q, limit)
+
+# Find farms within a radius of a point, nearest first
+@router.get("/farms/nearby", response_model=List[FarmDistanceResponse])
+async def get_nearby_farms(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(25, gt=0, le=2000),
+    crop_type: Optional[str] = None,
+    farm_status: Optional[FarmStatusEnum] = None,
+    limit: int = Query(100, ge=1),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    # Prune with index range scans over the geohash cells covering the circle,
+    # then the bounding box, before computing exact distances
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    query = select(Farm).where(
+        Farm.latitude.between(min_lat, max_lat),
+        Farm.longitude.between(min_lng, max_lng),
+    )
+    prefixes = covering_prefixes(lat, lng, radius_km)
+    if prefixes:
+        # "{" sorts directly after "z", the last geohash character
+        query = query.where(or_(*[
+            and_(Farm.geohash >= prefix, Farm.geohash < prefix + "{") for prefix in prefixes
+        ]))
+    if crop_type:
+        query = query.where(Farm.crop_type == crop_type)
+    if farm_status:
+        query = query.where(Farm.farm_status == farm_status)
+    
+    result = await db.execute(query)
+    
+    nearby = []
+    for farm in result.scalars().all():
+        distance = haversine_km(lat, lng, farm.latitude, farm.longitude)
+        if distance <= radius_km:
+            nearby.append((distance, farm))
+    nearby.sort(key=lambda item: item[0])
+    
+    return [
+        {**FarmResponse.model_validate(farm).model_dump(), "distance_km": round(distance, 3)}
+        for distance, farm in nearby[:limit]
+    ]
 
 # Get a specific farm by ID with its images
 @router.get("/farms/{farm_id}", response_model=FarmWithImagesResponse)
 async def get_farm(
     farm_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    # Get farm
-    farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    # Get farm together with its images
+    farm = await db.get(Farm, farm_id, options=[selectinload(Farm.images)])
     if not farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -172,28 +275,18 @@ async def get_farm(
         # Farmers can only see their own farms in detail
         pass  # We'll still return the farm, as it's public info
     
-    # Get images for the farm
-    images = db.query(FarmImage).filter(FarmImage.farm_id == farm_id).all()
-    
-    # Convert farm to dict and add images
-    farm_dict = {**farm.__dict__}
-    if "_sa_instance_state" in farm_dict:
-        farm_dict.pop("_sa_instance_state")
-    
-    farm_dict["images"] = images
-    
-    return farm_dict
+    return farm
 
 # Update a farm (only for farm owner)
 @router.put("/farms/{farm_id}", response_model=FarmResponse)
 async def update_farm(
     farm_id: int,
     farm_update: FarmUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if farm exists
-    db_farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    db_farm = await db.get(Farm, farm_id)
     if not db_farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -206,19 +299,20 @@ async def update_farm(
     for key, value in farm_data.items():
         setattr(db_farm, key, value)
     
-    db.commit()
-    db.refresh(db_farm)
+    await index_farm(db, db_farm)
+    await db.commit()
+    await db.refresh(db_farm)
     return db_farm
 
 # Delete a farm (only for farm owner)
 @router.delete("/farms/{farm_id}", status_code=204)
 async def delete_farm(
     farm_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if farm exists
-    db_farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    db_farm = await db.get(Farm, farm_id)
     if not db_farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -226,132 +320,70 @@ async def delete_farm(
     if current_user.username != db_farm.farmer_username:
         raise HTTPException(status_code=403, detail="You don't have permission to delete this farm")
     
-    # Get all images for the farm
-    farm_images = db.query(FarmImage).filter(FarmImage.farm_id == farm_id).all()
-    
-    # Delete all image files
-    for image in farm_images:
-        delete_file(image.image_url)
-        db.delete(image)
+    # Remove images, bids and the farm with set-based deletes in one transaction
+    result = await db.execute(select(FarmImage.image_url).where(FarmImage.farm_id == farm_id))
+    image_urls = result.scalars().all()
+    await db.execute(delete(FarmImage).where(FarmImage.farm_id == farm_id))
+    await db.execute(delete(Bid).where(Bid.farm_id == farm_id))
+    await unindex_farm(db, farm_id)
+    await db.execute(delete(Farm).where(Farm.id == farm_id))
+    await db.commit()
     
-    # Delete farm
-    db.delete(db_farm)
-    db.commit()
+    # Image files go in the background once nothing else references them
+    schedule_release(image_urls)
     return None
 
 # Get all farms owned by the current farmer
-@router.get("/farms/my-farms/", response_model=List[FarmResponse])
+@router.get("/farms/my-farms/", response_model=List[FarmWithRelationsResponse], response_model_exclude_unset=True)
 async def get_my_farms(
-    db: Session = Depends(get_db),
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     if current_user.user_type != UserType.FARMER:
         raise HTTPException(status_code=403, detail="Only farmers can access this endpoint")
     
-    farms = db.query(Farm).filter(Farm.farmer_username == current_user.username).all()
-    return farms
+    relations = parse_include(include, FARM_INCLUDES)
+    result = await db.execute(
+        select(Farm)
+        .where(Farm.farmer_username == current_user.username)
+        .options(*farm_load_options(relations, current_user))
+    )
+    return [farm_payload(farm, relations, current_user) for farm in result.scalars().all()]
 
 # Crop Disease Identification endpoint
 @router.post("/identify-disease", response_model=DiseaseIdentificationResponse)
-async def identify_disease(image: UploadFile = File(...), current_user: User = Depends(get_current_active_user)):
-    identification_url = "https://crop.kindwise.com/api/v1/identification"
-    
-    files = {
-        "images": (image.filename, await image.read(), image.content_type)
-    }
-    data = {
-        "latitude": "0.0",
-        "longitude": "0.0",
-        "similar_images": "true"
-    }
-    headers = {
-        "Api-Key": KINDWISE_API_KEY
-    }
-
-    # Step 1: Identify Disease
-    post_response = requests.post(identification_url, headers=headers, data=data, files=files)
-    if post_response.status_code != 201:
-        raise HTTPException(status_code=500, detail="Failed to identify disease")
-
-    identification_result = post_response.json()
-    access_token = identification_result.get("access_token")
-
-    if not access_token:
-        raise HTTPException(status_code=500, detail="No access token received")
-
-    # Step 2: Get Treatment Details
-    details_url = f"https://crop.kindwise.com/api/v1/identification/{access_token}?details=treatment"
-    details_response = requests.get(details_url, headers=headers)
-    if details_response.status_code != 200:
-        raise HTTPException(status_code=500, detail="Failed to fetch treatment details")
-
-    treatment_details = details_response.json()
-    
-    # Step 3: Process Disease Suggestion
-    disease_suggestions = treatment_details["result"]["disease"]["suggestions"]
-    highest_disease = max(disease_suggestions, key=lambda x: x["probability"])
-    treatment_info = highest_disease.get("details", {}).get("treatment", {})
-
-    return {
-        "name": highest_disease["name"],
-        "scientific_name": highest_disease.get("scientific_name", "N/A"),
-        "probability": highest_disease["probability"],
-        "treatment": {
-            "prevention": treatment_info.get("prevention", []),
-            "chemical": treatment_info.get("chemical treatment", []),
-            "biological": treatment_info.get("biological treatment", [])
-        }
-    }
+async def identify_disease(
+    image: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    content = await image.read()
+    try:
+        # Identical photos are answered from the content-hash cache
+        return await identify_with_cache(
+            db, "kindwise", content,
+            lambda: kindwise_identify(image.filename, content, image.content_type)
+        )
+    except ServiceDegraded as e:
+        raise HTTPException(status_code=503, detail=e.message, headers={"Retry-After": str(e.retry_after)})
+    except DiseaseAPIError as e:
+        raise HTTPException(status_code=500, detail=e.message)
 
 # Standalone Crop Disease Identification endpoint - exact implementation from provided script
 @router.post("/crop-disease-identify", status_code=201)
-async def crop_disease_identify(image: UploadFile = File(...)):
+async def crop_disease_identify(image: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     """Identify crop diseases from images using KindWise API - no auth required for easy testing"""
-    identification_url = "https://crop.kindwise.com/api/v1/identification"
-    
-    files = {
-        "images": (image.filename, await image.read(), image.content_type)
-    }
-    data = {
-        "latitude": "0.0",
-        "longitude": "0.0",
-        "similar_images": "true"
-    }
-    headers = {
-        "Api-Key": KINDWISE_API_KEY
-    }
-
-    # Step 1: Identify Disease
-    post_response = requests.post(identification_url, headers=headers, data=data, files=files)
-    if post_response.status_code != 201:
-        return JSONResponse(content={"error": "Failed to identify disease"}, status_code=500)
-
-    identification_result = post_response.json()
-    access_token = identification_result.get("access_token")
-
-    if not access_token:
-        return JSONResponse(content={"error": "No access token received"}, status_code=500)
-
-    # Step 2: Get Treatment Details
-    details_url = f"https://crop.kindwise.com/api/v1/identification/{access_token}?details=treatment"
-    details_response = requests.get(details_url, headers=headers)
-    if details_response.status_code != 200:
-        return JSONResponse(content={"error": "Failed to fetch treatment details"}, status_code=500)
-
-    treatment_details = details_response.json()
-    
-    # Step 3: Process Disease Suggestion
-    disease_suggestions = treatment_details["result"]["disease"]["suggestions"]
-    highest_disease = max(disease_suggestions, key=lambda x: x["probability"])
-    treatment_info = highest_disease.get("details", {}).get("treatment", {})
-
-    return {
-        "name": highest_disease["name"],
-        "scientific_name": highest_disease.get("scientific_name", "N/A"),
-        "probability": highest_disease["probability"],
-        "treatment": {
-            "prevention": treatment_info.get("prevention", []),
-            "chemical": treatment_info.get("chemical treatment", []),
-            "biological": treatment_info.get("biological treatment", [])
-        }
-    } 
\ No newline at end of file
+    content = await image.read()
+    try:
+        return await identify_with_cache(
+            db, "kindwise", content,
+            lambda: kindwise_identify(image.filename, content, image.content_type)
+        )
+    except ServiceDegraded as e:
+        return JSONResponse(
+            content={"error": e.message, "degraded": True}, status_code=503,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except DiseaseAPIError as e:
+        return JSONResponse(content={"error": e.message}, status_code=500)
@@ -0,0 +1,36 @@
+import logging
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, RedirectResponse
+
+from image_variants import VARIANT_SIZES, VARIANT_FORMATS, get_variant
+from workers import ExecutorSaturated
+
+logger = logging.getLogger("uvicorn.error")
+
+router = APIRouter(prefix="/api", tags=["media"])
+
+# Resized WebP/AVIF variant of a stored image, rendered on first request and cached on disk.
+# Falls back to the original when the variant cannot be produced right now.
+@router.get("/media/variants/{size}/{fmt}/{path:path}")
+async def get_image_variant(size: str, fmt: str, path: str):
+    if size not in VARIANT_SIZES or fmt not in VARIANT_FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown image variant")
+
+    relative = Path(path)
+    if relative.is_absolute() or ".." in relative.parts or not relative.parts or relative.parts[0] == "variants":
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    try:
+        variant = await get_variant(size, fmt, relative.as_posix())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    except ExecutorSaturated:
+        return RedirectResponse(f"/media/{relative.as_posix()}")
+    except Exception:
+        logger.exception("Could not render %s %s variant of %s", size, fmt, path)
+        return RedirectResponse(f"/media/{relative.as_posix()}")
+
+    # Stored names are unique per upload, so a variant never changes
+    return FileResponse(variant, media_type=f"image/{fmt}", headers={"Cache-Control": "public, max-age=31536000, immutable"})
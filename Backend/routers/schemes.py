@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from database import get_db
@@ -13,7 +14,7 @@ router = APIRouter(prefix="/api", tags=["schemes"])
 @router.post("/schemes/", response_model=GovSchemeResponse)
 async def create_scheme(
     scheme: GovSchemeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Only admin users can create schemes
@@ -24,35 +25,35 @@ async def create_scheme(
     db_scheme = GovScheme(**scheme.dict())
     
     db.add(db_scheme)
-    db.commit()
-    db.refresh(db_scheme)
+    await db.commit()
+    await db.refresh(db_scheme)
     return db_scheme
 
 # Get all government schemes
 @router.get("/schemes/", response_model=List[GovSchemeResponse])
 async def get_schemes(
     scheme_type: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    query = db.query(GovScheme)
+    query = select(GovScheme)
     
     # Filter by type if provided
     if scheme_type:
-        query = query.filter(GovScheme.type == scheme_type)
+        query = query.where(GovScheme.type == scheme_type)
     
     # Execute query
-    schemes = query.all()
-    return schemes
+    result = await db.execute(query)
+    return result.scalars().all()
 
 # Get a specific scheme by ID
 @router.get("/schemes/{scheme_id}", response_model=GovSchemeResponse)
 async def get_scheme(
     scheme_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    scheme = db.query(GovScheme).filter(GovScheme.id == scheme_id).first()
+    scheme = await db.get(GovScheme, scheme_id)
     if not scheme:
         raise HTTPException(status_code=404, detail="Scheme not found")
     
@@ -62,7 +63,7 @@ async def get_scheme(
 @router.post("/schemes/bulk/", response_model=List[GovSchemeResponse])
 async def bulk_create_schemes(
     schemes: List[GovSchemeCreate],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Only admin users can create schemes
@@ -75,10 +76,10 @@ async def bulk_create_schemes(
         db.add(db_scheme)
         db_schemes.append(db_scheme)
     
-    db.commit()
+    await db.commit()
     
     # Refresh all schemes
     for scheme in db_schemes:
-        db.refresh(scheme)
+        await db.refresh(scheme)
     
     return db_schemes 
\ No newline at end of file
@@ -1,8 +1,9 @@
 # schemas.py
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, computed_field
+from typing import Any, Dict, Optional, List
 from datetime import date, datetime
-from models import UserType, FarmStatusEnum, BidStatusEnum
+from models import UserType, FarmStatusEnum, BidStatusEnum, BidEventType, CropHealthJobStatus
+from image_variants import thumbnail_url, variant_urls
 
 
 class Token(BaseModel):
@@ -104,6 +105,9 @@ class FarmResponse(FarmBase):
     class Config:
         from_attributes = True
 
+class FarmDistanceResponse(FarmResponse):
+    distance_km: float
+
 # Farm Image Schemas
 class FarmImageBase(BaseModel):
     farm_id: int
@@ -116,6 +120,17 @@ class FarmImageResponse(FarmImageBase):
     id: int
     created_at: datetime
 
+    # Resized WebP/AVIF versions for cards and galleries; empty when variants are unavailable
+    @computed_field
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        return thumbnail_url(self.image_url)
+
+    @computed_field
+    @property
+    def variants(self) -> Dict[str, str]:
+        return variant_urls(self.image_url)
+
     class Config:
         from_attributes = True
 
@@ -127,6 +142,9 @@ class BidBase(BaseModel):
 class BidCreate(BidBase):
     pass
 
+class BidBulkCreate(BaseModel):
+    bids: List[BidCreate]
+
 class BidUpdate(BaseModel):
     bid_amount: Optional[float] = None
     status: Optional[BidStatusEnum] = None
@@ -141,6 +159,48 @@ class BidResponse(BidBase):
     class Config:
         from_attributes = True
 
+class BidBulkItemResult(BaseModel):
+    # Position of the item in the request
+    index: int
+    farm_id: int
+    success: bool
+    bid: Optional[BidResponse] = None
+    error: Optional[str] = None
+
+class BidBulkResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BidBulkItemResult]
+
+class BidStatsResponse(BaseModel):
+    farm_id: int
+    bid_count: int = 0
+    pending_count: int = 0
+    min_bid: Optional[float] = None
+    max_bid: Optional[float] = None
+    avg_bid: Optional[float] = None
+    latest_bid_at: Optional[datetime] = None
+
+class BidEventResponse(BaseModel):
+    id: int
+    bid_id: int
+    farm_id: int
+    # Only shown to the farm owner and to the company that placed the bid
+    company_username: Optional[str] = None
+    event_type: BidEventType
+    bid_amount: float
+    status: BidStatusEnum
+    previous_amount: Optional[float] = None
+    previous_status: Optional[BidStatusEnum] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class BidEventPage(BaseModel):
+    items: List[BidEventResponse]
+    next_cursor: Optional[str] = None
+
 # Additional response schemas
 class FarmWithBidsResponse(FarmResponse):
     bids: List[BidResponse] = []
@@ -151,6 +211,30 @@ class BidWithFarmResponse(BidResponse):
 class FarmWithImagesResponse(FarmResponse):
     images: List[FarmImageResponse] = []
 
+class FarmerSummary(BaseModel):
+    username: str
+    full_name: str
+
+    class Config:
+        from_attributes = True
+
+# Related rows are only present when requested with `include=`
+class FarmWithRelationsResponse(FarmResponse):
+    images: Optional[List[FarmImageResponse]] = None
+    bids: Optional[List[BidResponse]] = None
+    farmer: Optional[FarmerSummary] = None
+
+class BidWithRelationsResponse(BidResponse):
+    farm: Optional[FarmResponse] = None
+
+class FarmPage(BaseModel):
+    items: List[FarmWithRelationsResponse]
+    next_cursor: Optional[str] = None
+
+class BidPage(BaseModel):
+    items: List[BidWithRelationsResponse]
+    next_cursor: Optional[str] = None
+
 # Disease Identification Schemas
 class TreatmentInfo(BaseModel):
     prevention: List[str] = []
@@ -182,6 +266,21 @@ class CropHealthRecordResponse(CropHealthRecordBase):
     class Config:
         from_attributes = True
 
+class CropHealthJobResponse(BaseModel):
+    id: int
+    status: CropHealthJobStatus
+    image_path: str
+    detected_disease: Optional[str] = None
+    scientific_name: Optional[str] = None
+    confidence_score: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Government Schemes Schemas
 class GovSchemeBase(BaseModel):
     scheme_name: str
@@ -0,0 +1,135 @@
+# search.py - Full-text search index over farm listings
+# Indexes farm_location, crop_type and pesticides_used in an SQLite FTS5 table
+# or a Postgres tsvector table with a GIN index. Other backends fall back to
+# substring matching. The routers keep the index in sync on every farm write.
+import re
+from typing import List
+
+from sqlalchemy import or_, select, text
+
+from models import Farm
+
+# Maximum number of search terms taken from a query
+MAX_TERMS = 8
+
+
+def _dialect_name(bind) -> str:
+    return bind.dialect.name
+
+
+def search_terms(query: str) -> List[str]:
+    """Split a user query into lowercase word terms."""
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def create_search_index(connection):
+    """Create the search index structures for the connected backend."""
+    dialect = _dialect_name(connection)
+    if dialect == "sqlite":
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS farms_fts "
+            "USING fts5(farm_location, crop_type, pesticides_used, tokenize='unicode61')"
+        )
+    elif dialect == "postgresql":
+        connection.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS farm_search ("
+            "farm_id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)"
+        )
+        connection.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_farm_search_document ON farm_search USING GIN (document)"
+        )
+
+
+# Postgres document: location and crop outrank pesticide notes
+_PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce({location}, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({crop}, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({pesticides}, '')), 'B')"
+)
+
+
+def rebuild_search_index(connection):
+    """Repopulate the search index from the farms table (sync connection)."""
+    dialect = _dialect_name(connection)
+    if dialect == "sqlite":
+        connection.exec_driver_sql("DELETE FROM farms_fts")
+        connection.exec_driver_sql(
+            "INSERT INTO farms_fts(rowid, farm_location, crop_type, pesticides_used) "
+            "SELECT id, farm_location, coalesce(crop_type, ''), coalesce(pesticides_used, '') FROM farms"
+        )
+    elif dialect == "postgresql":
+        connection.exec_driver_sql("DELETE FROM farm_search")
+        document = _PG_DOCUMENT.format(location="farm_location", crop="crop_type", pesticides="pesticides_used")
+        connection.exec_driver_sql(f"INSERT INTO farm_search (farm_id, document) SELECT id, {document} FROM farms")
+
+
+async def unindex_farm(db, farm_id: int):
+    """Remove a farm from the search index."""
+    dialect = _dialect_name(db.bind)
+    if dialect == "sqlite":
+        await db.execute(text("DELETE FROM farms_fts WHERE rowid = :id"), {"id": farm_id})
+    elif dialect == "postgresql":
+        await db.execute(text("DELETE FROM farm_search WHERE farm_id = :id"), {"id": farm_id})
+
+
+async def index_farm(db, farm: Farm):
+    """Insert or replace a farm's entry in the search index."""
+    await unindex_farm(db, farm.id)
+    params = {
+        "id": farm.id,
+        "location": farm.farm_location,
+        "crop": farm.crop_type or "",
+        "pesticides": farm.pesticides_used or "",
+    }
+    dialect = _dialect_name(db.bind)
+    if dialect == "sqlite":
+        await db.execute(text(
+            "INSERT INTO farms_fts(rowid, farm_location, crop_type, pesticides_used) "
+            "VALUES (:id, :location, :crop, :pesticides)"
+        ), params)
+    elif dialect == "postgresql":
+        document = _PG_DOCUMENT.format(location=":location", crop=":crop", pesticides=":pesticides")
+        await db.execute(text(f"INSERT INTO farm_search (farm_id, document) VALUES (:id, {document})"), params)
+
+
+async def search_farms(db, query: str, limit: int) -> List[Farm]:
+    """
+    Return farms matching every term of ``query``, best match first.
+
+    Each term also matches as a prefix, so "tom" finds "Tomato".
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    dialect = _dialect_name(db.bind)
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        # bm25 weights per column: location, crop, pesticides (lower score is better)
+        ranked = await db.execute(text(
+            "SELECT rowid FROM farms_fts WHERE farms_fts MATCH :match "
+            "ORDER BY bm25(farms_fts, 2.0, 2.0, 1.0) LIMIT :limit"
+        ), {"match": match, "limit": limit})
+    elif dialect == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        ranked = await db.execute(text(
+            "SELECT farm_id FROM farm_search WHERE document @@ to_tsquery('simple', :query) "
+            "ORDER BY ts_rank(document, to_tsquery('simple', :query)) DESC LIMIT :limit"
+        ), {"query": tsquery, "limit": limit})
+    else:
+        fallback = select(Farm)
+        for term in terms:
+            fallback = fallback.where(or_(
+                Farm.farm_location.ilike(f"%{term}%"),
+                Farm.crop_type.ilike(f"%{term}%"),
+                Farm.pesticides_used.ilike(f"%{term}%"),
+            ))
+        result = await db.execute(fallback.limit(limit))
+        return result.scalars().all()
+
+    farm_ids = ranked.scalars().all()
+    if not farm_ids:
+        return []
+    result = await db.execute(select(Farm).where(Farm.id.in_(farm_ids)))
+    farms = {farm.id: farm for farm in result.scalars().all()}
+    return [farms[farm_id] for farm_id in farm_ids if farm_id in farms]
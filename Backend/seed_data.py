@@ -5,9 +5,12 @@ from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 import random
 from typing import List
+from pathlib import Path
 
-from database import get_db, engine
-from models import Base, User, Farm, Bid, UserType, FarmStatusEnum, BidStatusEnum, FarmImage
+from database import SessionLocal, engine
+from search import rebuild_search_index
+from media_store import ingest_file
+from models import Base, User, Farm, Bid, BidEvent, BidEventType, UserType, FarmStatusEnum, BidStatusEnum, FarmImage
 
 # Password handling
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -119,7 +122,7 @@ def get_crops_for_state(state):
     return random.choice(list(CROP_TYPES.values()))
 
 def seed_database():
-    db = next(get_db())
+    db = SessionLocal()
     
     try:
         print("Creating farmers with realistic Indian data...")
@@ -247,6 +250,7 @@ def seed_database():
         
         # Associate images with farms (2-4 images per farm)
         farm_images = []
+        image_urls = {}
         
         for farm_id in farm_ids:
             # Determine how many images for this farm (2-4)
@@ -254,7 +258,10 @@ def seed_database():
             farm_image_files = random.sample(image_files, min(num_images, len(image_files)))
             
             for img_file in farm_image_files:
-                image_url = f"/media/farm_images/{img_file}"
+                # Shared images are stored once in content-addressed storage
+                if img_file not in image_urls:
+                    image_urls[img_file] = ingest_file(Path(image_dir) / img_file) or f"/media/farm_images/{img_file}"
+                image_url = image_urls[img_file]
                 created_at = datetime.now() - timedelta(days=random.randint(1, 30))
                 
                 farm_images.append({
@@ -313,8 +320,23 @@ def seed_database():
                         "updated_at": updated_at
                     })
         
-        for bid_data in bids:
-            db.add(Bid(**bid_data))
+        seeded_bids = [Bid(**bid_data) for bid_data in bids]
+        db.add_all(seeded_bids)
+        db.flush()
+        
+        # Bid history, as the bid endpoints would have recorded it
+        for bid in seeded_bids:
+            event = dict(bid_id=bid.id, farm_id=bid.farm_id, company_username=bid.company_username, bid_amount=float(bid.bid_amount))
+            db.add(BidEvent(**event, event_type=BidEventType.CREATED, status=BidStatusEnum.PENDING, created_at=bid.bid_date))
+            if bid.status != BidStatusEnum.PENDING:
+                db.add(BidEvent(
+                    **event, event_type=BidEventType.STATUS_CHANGED, status=bid.status,
+                    previous_status=BidStatusEnum.PENDING, created_at=bid.updated_at
+                ))
+        db.commit()
+        
+        # Farms were inserted directly, so rebuild the search index in one pass
+        rebuild_search_index(db.connection())
         db.commit()
         
         print("Database seeded successfully with realistic Indian agricultural data!")
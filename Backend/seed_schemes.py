@@ -8,7 +8,7 @@ from sqlalchemy.ext.declarative import declarative_base
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import Base, GovScheme
-from database import get_db, engine
+from database import SessionLocal, engine
 
 def seed_schemes(db: Session):
     # Check if schemes already exist
@@ -145,7 +145,7 @@ if __name__ == "__main__":
     Base.metadata.create_all(bind=engine)
     
     # Seed the database
-    db = next(get_db())
+    db = SessionLocal()
     try:
         seed_schemes(db)
     finally:
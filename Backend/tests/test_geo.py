@@ -0,0 +1,41 @@
+import math
+import random
+
+from geo import bounding_box, covering_prefixes, encode_geohash, haversine_km
+
+
+def destination(latitude, longitude, bearing_deg, distance_km):
+    """Point reached from a start point along a great circle."""
+    angular = distance_km / 6371.0088
+    phi1, lambda1, theta = math.radians(latitude), math.radians(longitude), math.radians(bearing_deg)
+    phi2 = math.asin(math.sin(phi1) * math.cos(angular) + math.cos(phi1) * math.sin(angular) * math.cos(theta))
+    lambda2 = lambda1 + math.atan2(
+        math.sin(theta) * math.sin(angular) * math.cos(phi1),
+        math.cos(angular) - math.sin(phi1) * math.sin(phi2)
+    )
+    return math.degrees(phi2), math.degrees(lambda2)
+
+
+def prefilter_keeps(latitude, longitude, radius_km, point):
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    in_box = min_lat <= point[0] <= max_lat and min_lng <= point[1] <= max_lng
+    prefixes = covering_prefixes(latitude, longitude, radius_km)
+    geohash = encode_geohash(*point)
+    in_cells = not prefixes or any(geohash.startswith(prefix) for prefix in prefixes)
+    return in_box and in_cells
+
+
+def test_point_just_inside_radius_is_kept():
+    point = destination(18.52, 73.85, 0, 99.94)
+    assert haversine_km(18.52, 73.85, *point) < 100
+    assert prefilter_keeps(18.52, 73.85, 100, point)
+
+
+def test_prefilter_never_drops_points_inside_radius():
+    rng = random.Random(7)
+    for _ in range(20000):
+        latitude, longitude = rng.uniform(-70, 70), rng.uniform(-170, 170)
+        radius_km = rng.choice([1, 10, 50, 100, 500])
+        point = destination(latitude, longitude, rng.uniform(0, 360), radius_km * rng.uniform(0.99, 1.0))
+        if haversine_km(latitude, longitude, *point) <= radius_km and -180 <= point[1] <= 180:
+            assert prefilter_keeps(latitude, longitude, radius_km, point), (latitude, longitude, radius_km, point)
@@ -1,59 +1,161 @@
+import asyncio
+import hashlib
 import os
-import shutil
-from fastapi import UploadFile
+from fastapi import HTTPException, UploadFile
 from pathlib import Path
+from typing import NamedTuple, Optional
 import uuid
 
+from dotenv import load_dotenv
+
+load_dotenv()
+
 # Create media directory if it doesn't exist
 MEDIA_DIR = Path("media")
 FARM_IMAGES_DIR = MEDIA_DIR / "farm_images"
 FARM_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+# Content-addressed storage for uploaded images, see object_path()
+OBJECTS_DIR = MEDIA_DIR / "objects"
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-async def save_upload_file(upload_file: UploadFile, directory: Path = FARM_IMAGES_DIR) -> str:
+class StoredFile(NamedTuple):
+    path: Path
+    size: int
+    digest: str
+    created: bool  # False when identical content was already stored
+    content: Optional[bytes]
+
+def detect_image_type(header: bytes) -> Optional[str]:
     """
-    Save an uploaded file to the specified directory and return the file path.
+    Identify an image format from its leading bytes.
+    
+    Returns:
+        The file extension for the format, or None if it is not a supported image
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand in (b"avif", b"avis"):
+            return ".avif"
+        if brand in (b"heic", b"heix", b"hevc", b"mif1", b"msf1"):
+            return ".heic"
+    return None
+
+def object_path(digest: str, extension: str) -> Path:
+    """
+    Location of a content-addressed file.
+    
+    Files are named by the SHA-256 of their bytes and sharded two directory
+    levels deep (objects/ab/cd/abcd...), so identical uploads share one file
+    and no directory grows past a few hundred entries.
+    """
+    return OBJECTS_DIR / digest[:2] / digest[2:4] / f"{digest}{extension}"
+
+def media_url(path: Path) -> str:
+    """URL path of a stored file, as saved in the database."""
+    return f"/{path.as_posix()}"
+
+def _write_chunk(buffer, digest, chunk: bytes):
+    buffer.write(chunk)
+    digest.update(chunk)
+
+def _commit_object(temp_path: Path, file_path: Path) -> bool:
+    if file_path.exists():
+        # Same content already stored; refresh its mtime so a concurrent GC sweep keeps it
+        temp_path.unlink()
+        os.utime(file_path)
+        return False
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, file_path)
+    return True
+
+async def store_upload(
+    upload_file: UploadFile,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    keep_content: bool = False,
+) -> StoredFile:
+    """
+    Stream an uploaded image into content-addressed storage without blocking the event loop.
+    
+    The format is taken from the file's magic bytes, not the client's
+    content type or filename. Chunks are written and hashed from a worker
+    thread into a temporary file, which is then renamed to its SHA-256 path;
+    an upload whose content is already stored reuses the existing file.
+    Uploads larger than ``max_bytes`` are aborted.
     
     Args:
         upload_file: The uploaded file
-        directory: Directory to save the file in
+        max_bytes: Size limit; larger uploads raise 413
+        keep_content: Also return the file's bytes, for callers that analyze them
         
     Returns:
-        The path to the saved file (relative to the media directory)
+        The stored file's path, size, digest and whether it was newly written, plus its content if requested
     """
-    # Generate a unique filename to avoid collisions
-    file_extension = os.path.splitext(upload_file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = directory / unique_filename
+    if upload_file.size is not None and upload_file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
     
-    # Create a temporary file to store the upload
-    with open(file_path, "wb") as buffer:
-        # Copy file contents to destination
-        shutil.copyfileobj(upload_file.file, buffer)
+    first_chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+    extension = detect_image_type(first_chunk[:16])
+    if extension is None:
+        raise HTTPException(status_code=400, detail="File must be a JPEG, PNG, GIF, WebP, AVIF or HEIC image")
     
-    # Reset the file pointer
-    await upload_file.seek(0)
+    OBJECTS_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = OBJECTS_DIR / f".{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+    kept = [] if keep_content else None
+    size = 0
+    try:
+        buffer = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            chunk = first_chunk
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+                await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
+                if kept is not None:
+                    kept.append(chunk)
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+        finally:
+            await asyncio.to_thread(buffer.close)
+        file_path = object_path(digest.hexdigest(), extension)
+        created = await asyncio.to_thread(_commit_object, temp_path, file_path)
+    except BaseException:
+        await asyncio.to_thread(temp_path.unlink, True)
+        raise
+    finally:
+        # Reset the file pointer
+        await upload_file.seek(0)
     
-    # Return relative path for storage in database
-    return f"/media/farm_images/{unique_filename}"
+    return StoredFile(file_path, size, digest.hexdigest(), created, b"".join(kept) if kept is not None else None)
 
-def delete_file(file_path: str) -> bool:
+def parse_include(include: str | None, allowed: set) -> set:
     """
-    Delete a file given its path.
+    Parse a comma-separated ``include`` query parameter.
     
     Args:
-        file_path: Path to the file to delete (as stored in the database)
+        include: Raw parameter value, e.g. "images,bids"
+        allowed: Relation names the endpoint can embed
         
     Returns:
-        True if the file was deleted, False otherwise
+        The set of requested relation names
     """
-    # Convert to absolute path
-    abs_path = Path(".") / file_path.lstrip("/")
-    
-    try:
-        if abs_path.exists():
-            abs_path.unlink()
-            return True
-    except Exception as e:
-        print(f"Error deleting file: {e}")
-    
-    return False 
\ No newline at end of file
+    if not include:
+        return set()
+    requested = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return requested
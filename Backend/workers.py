@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional
+
+import metrics
+
+logger = logging.getLogger("uvicorn.error")
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when a BoundedExecutor or JobQueue has no room for more work"""
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for blocking work called from async handlers.
+
+    ``max_workers`` caps how many tasks run at once and ``max_pending`` caps
+    how many may be queued or running; beyond that, run() fails fast with
+    ExecutorSaturated instead of letting the queue grow without bound.
+    Queue time (submit to start) is tracked so saturation shows up in metrics.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.run_time_total = 0.0
+        _executors.append(self)
+        metrics.register(name, self.stats)
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on the pool and return its result."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturated(f"{self.name} has {self._pending} tasks pending")
+            self._pending += 1
+
+        submitted = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.monotonic()
+                with self._lock:
+                    queued = started - submitted
+                    self.queue_time_total += queued
+                    self.queue_time_max = max(self.queue_time_max, queued)
+                    self.run_time_total += finished - started
+                    self.completed += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint."""
+        with self._lock:
+            completed = self.completed
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": completed,
+                "rejected": self.rejected,
+                "avg_queue_ms": round(self.queue_time_total / completed * 1000, 2) if completed else 0.0,
+                "max_queue_ms": round(self.queue_time_max * 1000, 2),
+                "avg_run_ms": round(self.run_time_total / completed * 1000, 2) if completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_executors: List[BoundedExecutor] = []
+
+def shutdown_executors():
+    """Stop every BoundedExecutor; called on application shutdown."""
+    for executor in _executors:
+        executor.shutdown()
+
+class JobQueue:
+    """
+    Bounded pool of asyncio workers for work that outlives the request.
+
+    ``workers`` tasks pull jobs from a queue holding at most ``max_queued``
+    entries and pass each one to ``handler``; submit() fails fast with
+    ExecutorSaturated when the queue is full. start() and stop() are called
+    from the application startup and shutdown events.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], workers: int, max_queued: int):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        metrics.register(name, self.stats)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; jobs still queued are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def free_slots(self) -> int:
+        if self._queue is None:
+            return 0
+        return self.max_queued - self._queue.qsize()
+
+    def submit(self, job):
+        """Queue a job for the workers without waiting for it to run."""
+        if self._queue is None:
+            raise RuntimeError(f"{self.name} is not running")
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.name} has {self._queue.qsize()} jobs queued")
+        self.submitted += 1
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self.running += 1
+            try:
+                await self.handler(job)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("%s: job %r failed", self.name, job)
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint."""
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -13,6 +13,8 @@ export default function FarmCard({ farm }) {
         return 'bg-green-100 text-green-800 border-green-300';
       case 'growing':
         return 'bg-yellow-100 text-yellow-800 border-yellow-300';
+      case 'sold':
+        return 'bg-blue-100 text-blue-800 border-blue-300';
       default:
         return 'bg-gray-100 text-gray-800 border-gray-300';
     }
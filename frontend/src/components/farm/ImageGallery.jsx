@@ -6,22 +6,24 @@ import Image from 'next/image';
 export default function ImageGallery({ images = [] }) {
   const [selectedImage, setSelectedImage] = useState(images.length > 0 ? 0 : null);
   const [imageUrls, setImageUrls] = useState([]);
+  const [thumbnailUrls, setThumbnailUrls] = useState([]);
   const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
   // Prepare image URLs, ensuring they include the full URL if needed
   useEffect(() => {
     if (images && images.length > 0) {
       // Map the image URLs to ensure they have the full API URL if they're relative paths
-      const preparedUrls = images.map(img => {
-        const imgUrl = img.image_url;
+      const toAbsolute = (imgUrl) => {
         // If the URL starts with / or media/, prepend the API URL
         if (imgUrl.startsWith('/') || imgUrl.startsWith('media/')) {
           return `${API_URL}${imgUrl.startsWith('/') ? '' : '/'}${imgUrl}`;
         }
         return imgUrl;
-      });
+      };
       
-      setImageUrls(preparedUrls);
+      setImageUrls(images.map(img => toAbsolute(img.image_url)));
+      // Small server-rendered variants for the thumbnail strip, falling back to the original
+      setThumbnailUrls(images.map(img => toAbsolute(img.thumbnail_url || img.image_url)));
     }
   }, [images, API_URL]);
 
@@ -68,7 +70,7 @@ export default function ImageGallery({ images = [] }) {
       {/* Thumbnails - show only if there are multiple images */}
       {images.length > 1 && (
         <div className="flex space-x-2 overflow-x-auto py-2">
-          {imageUrls.map((url, index) => (
+          {thumbnailUrls.map((url, index) => (
             <div
               key={`thumb-${index}`}
               className={`relative cursor-pointer border-2 rounded-lg overflow-hidden ${